@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+"""Times `check.parse_bibitems` against the character-by-character
+implementation it replaced, using synthetic BibTeX output in the form
+generated by `bathx.bst`.
+"""
+import os
+import sys
+import timeit
+import typing as t
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from check import parse_bibitems  # noqa: E402
+from legacy import parse_bibitems_charwise  # noqa: E402
+
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+
+
+def make_bbl_lines(records: int, authors: int) -> t.List[str]:
+    """Returns lines as formerly produced by `check.get_bibitems` for a
+    number of records, each with the given number of authors.
+    """
+    lines = list()
+    for i in range(records):
+        names = [
+            f"\\bibinfo{{author}}{{Author{j}, A.B.}}" for j in range(authors - 1)
+        ]
+        names.append(f"\\bibinfo{{author}}{{Last{i}, Z.}}")
+        lines.append(
+            f"\\bibitem[{{Author0 et~al.(2012{{\\natexlab{{a}}}})Author0, "
+            f"Author1 and Last{i}}}]{{item{i}}}"
+        )
+        lines.append(
+            ", ".join(names[:-1])
+            + f" and {names[-1]}, \\bibinfo{{year}}{{2012}}{{\\natexlab{{a}}}}. "
+            f"\\newblock \\emph{{\\bibinfo{{title}}{{Title of work {i}}}}}. "
+            "\\newblock \\bibinfo{edition}{7th} ed. "
+            "\\newblock \\bibinfo{address}{Edinburgh}: "
+            "\\bibinfo{publisher}{Elsevier Churchill Livingstone}. "
+            "\\newblock \\urlprefix\\url{https://example.org/{\\relax}item} "
+            "[\\urldateprefix{}\\bibinfo{urldate}{1~May 2020}]."
+        )
+        lines.append("")
+    return lines
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option("-n", "--records", default=200, show_default=True)
+@click.option(
+    "-a",
+    "--authors",
+    "author_counts",
+    multiple=True,
+    type=int,
+    default=[3, 30, 300],
+    show_default=True,
+    help="Number of authors per record; may be given more than once.",
+)
+@click.option("-r", "--repeat", default=5, show_default=True)
+def main(records, author_counts, repeat):
+    """Benchmarks parsing of BibTeX bibitems."""
+    for authors in author_counts:
+        lines = make_bbl_lines(records, authors)
+        items = [(f"item{i}", lines[3 * i + 1]) for i in range(records)]
+        if parse_bibitems(items) != parse_bibitems_charwise(lines):
+            raise click.ClickException(f"Outputs differ with {authors} authors.")
+
+        size = sum(len(line) for line in lines)
+        old = min(
+            timeit.repeat(lambda: parse_bibitems_charwise(lines), number=1, repeat=repeat)
+        )
+        new = min(timeit.repeat(lambda: parse_bibitems(items), number=1, repeat=repeat))
+        click.echo(
+            f"{records} records x {authors} authors ({size / 1024:.0f} KiB): "
+            f"charwise {old * 1000:.1f} ms, tokenized {new * 1000:.1f} ms, "
+            f"speedup {old / new:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+#! /usr/bin/env python3
+"""Times each parsing and comparison stage of `check.py`, and the
+report generation in `csl/check_output.py`, on fixtures derived from
+the real test sources and on scaled copies of them. Records throughput
+and peak memory, and compares them with a stored baseline.
+"""
+
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import tempfile
+import textwrap
+import time
+import tracemalloc
+import typing as t
+
+import click
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import check  # noqa: E402
+from csl import check_output  # noqa: E402
+from csl.check_output import write_report  # noqa: E402
+
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+_BIBEXBOX_ID = re.compile(r"(\\begin\{bibexbox\}[^{]*\{)([^}]*)\}")
+_CITE_ID = re.compile(r"(\\cite\{)([^}]*)\}")
+_EMPH = re.compile(r"\\emph\{([^{}]*)\}")
+
+
+class Result(t.NamedTuple):
+    """Measurements for one stage at one scale."""
+
+    entries: int
+    size: int
+    seconds: float
+    peak: int
+
+    def throughput(self) -> float:
+        """Returns input processed in MiB per second."""
+        return self.size / 2**20 / self.seconds if self.seconds else 0.0
+
+
+def scale_text(text: str, pattern: t.Pattern, scale: int) -> str:
+    """Returns text repeated `scale` times, with the IDs matched by
+    `pattern` given a different suffix in each copy.
+    """
+    copies = [text]
+    for i in range(1, scale):
+        copies.append(pattern.sub(lambda m: f"{m.group(1)}{m.group(2)}-{i}}}", text))
+    return "\n".join(copies)
+
+
+def wrap(text: str) -> t.List[str]:
+    """Breaks reference into lines as LaTeX tools do."""
+    return textwrap.wrap(text, 79, break_long_words=False, break_on_hyphens=False)
+
+
+def make_bbl(targets: t.Dict[str, str]) -> str:
+    """Returns BibTeX output for the given target references."""
+    parts = [f"\\begin{{thebibliography}}{{{len(targets)}}}\n\n"]
+    for key, target in targets.items():
+        text = target.replace(". ", ". \\newblock ")
+        parts.append(f"\\bibitem[{{Label(2012)}}]{{{key}}}\n")
+        parts.append("\n".join(wrap(text)) + "\n\n")
+    parts.append("\\end{thebibliography}\n")
+    return "".join(parts)
+
+
+def make_bbi(targets: t.Dict[str, str]) -> str:
+    """Returns biblatex2bibitem output (as extracted by pdftotext) for
+    the given target references.
+    """
+    parts = ["Bibliography\n"]
+    for key, target in targets.items():
+        parts.append(f"\\bibitem{{{key}}}\n" + "\n".join(wrap(target)) + "\n{}\n\n")
+    return "".join(parts)
+
+
+def latex_to_html(text: str) -> str:
+    """Crudely converts a target reference to HTML."""
+    text = text.replace("&", "&amp;").replace("\\&", "&amp;").replace("<", "&lt;")
+    return _EMPH.sub(r"<em>\1</em>", text)
+
+
+def make_raw_html(targets: t.Dict[str, str]) -> str:
+    """Returns pandoc output for the CSL test document with the given
+    target references, one in seven of which are rendered incorrectly.
+    """
+    parts = [
+        "<!DOCTYPE html>\n",
+        '<html><head><meta charset="UTF-8"><title>CSL Test Suite</title>'
+        "</head><body>\n",
+    ]
+    refs = list()
+    for i, (key, target) in enumerate(targets.items()):
+        cite = f"({key}, 2012)"
+        target = latex_to_html(target)
+        parts.append(
+            f'<p>RX: {cite} = <span class="citation" data-cites="{key}">'
+            f"{cite}</span></p>\n"
+        )
+        parts.append(f"<p>{target}</p>\n")
+        output = target.replace(".", ",", 1) if i % 7 == 0 else target
+        refs.append(f'<div id="ref-{key}" class="csl-entry" role="listitem">\n')
+        refs.append(f"{output}\n</div>\n")
+    parts.append('<div id="refs" class="references csl-bib-body" role="list">\n')
+    parts.extend(refs)
+    parts.append("</div>\n</body></html>\n")
+    return "".join(parts)
+
+
+class Fixtures:
+    """Test sources scaled up by a given factor, written to `dirname`."""
+
+    def __init__(self, dirname: str, scale: int):
+        self.dirname = dirname
+        self.scale = scale
+        with open(os.path.join(ROOT, "bst", "bath-bst.dtx")) as f:
+            self.dtx = self.write(
+                "bath-bst.dtx", scale_text(f.read(), _BIBEXBOX_ID, scale)
+            )
+        with open(os.path.join(ROOT, "csl", "bath-csl-test.tex")) as f:
+            self.tex = self.write(
+                "bath-csl-test.tex", scale_text(f.read(), _CITE_ID, scale)
+            )
+        self.targets = check.extract_dtx_targets(self.dtx)
+        self.csl_targets = check.extract_csl_targets(self.tex)
+        self.bbl = self.write("bath-bst.bbl", make_bbl(self.targets))
+        self.bbi = self.write("test-output.bbi", make_bbi(self.targets))
+        self.raw_html = self.write(
+            "bath-csl-test-raw.html", make_raw_html(self.csl_targets)
+        )
+        self.report = os.path.join(dirname, "bath-csl-test.html")
+        write_report(self.raw_html, self.report)
+        for filepath in (self.bbl, self.bbi, self.report):
+            check._up_to_date.add(filepath)
+
+    def write(self, filename: str, text: str) -> str:
+        filepath = os.path.join(self.dirname, filename)
+        with open(filepath, "w") as f:
+            f.write(text)
+        return filepath
+
+
+def size_of(filepath: str) -> int:
+    return os.path.getsize(filepath)
+
+
+def lines_size(lines: t.Iterable[str]) -> int:
+    return sum(len(line.encode("utf-8")) + 1 for line in lines)
+
+
+def stage_extract_dtx_targets(fx: Fixtures):
+    return lambda: check.extract_dtx_targets(fx.dtx), size_of(fx.dtx)
+
+
+def stage_extract_csl_targets(fx: Fixtures):
+    return lambda: check.extract_csl_targets(fx.tex), size_of(fx.tex)
+
+
+def records_size(records: t.Iterable[t.Tuple[str, str]]) -> int:
+    return sum(lines_size(record) for record in records)
+
+
+def stage_get_bibitems(fx: Fixtures):
+    return lambda: list(check.get_bibitems(fx.bbl)), size_of(fx.bbl)
+
+
+def stage_parse_bibitems(fx: Fixtures):
+    records = list(check.get_bibitems(fx.bbl))
+    return lambda: check.parse_bibitems(records), records_size(records)
+
+
+def stage_parse_simple_bibitems(fx: Fixtures):
+    records = list(check.get_bibitems(fx.bbi))
+    return lambda: check.parse_simple_bibitems(records), records_size(records)
+
+
+def stage_check_output(fx: Fixtures):
+    outfile = os.path.join(fx.dirname, "report.html")
+
+    def run():
+        # Parse the raw HTML afresh each time, as the script does
+        check_output._parsed.clear()
+        write_report(fx.raw_html, outfile)
+        return fx.csl_targets
+
+    return run, size_of(fx.raw_html)
+
+
+def stage_parse_csl_refs(fx: Fixtures):
+    return lambda: check.parse_csl_refs(fx.report)[0], size_of(fx.report)
+
+
+def stage_contrast_refs(fx: Fixtures):
+    outputs = check.parse_bibitems(check.get_bibitems(fx.bbl))
+
+    def run():
+        list(check.contrast_refs(Target=fx.targets, Output=outputs))
+        return fx.targets
+
+    size = lines_size(fx.targets.values()) + lines_size(outputs.values())
+    return run, size
+
+
+STAGES = {
+    "extract_dtx_targets": stage_extract_dtx_targets,
+    "extract_csl_targets": stage_extract_csl_targets,
+    "get_bibitems": stage_get_bibitems,
+    "parse_bibitems": stage_parse_bibitems,
+    "parse_simple_bibitems": stage_parse_simple_bibitems,
+    "check_output": stage_check_output,
+    "parse_csl_refs": stage_parse_csl_refs,
+    "contrast_refs": stage_contrast_refs,
+}
+"""Maps each stage to a function returning a callable that runs the
+stage on the given fixtures, and the size of its input in bytes.
+"""
+
+
+def _peak_child(func: t.Callable[[], t.Any], conn) -> None:
+    gc.collect()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func()
+    _, traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send(max(traced, (after - before) * 1024))
+
+
+def peak_memory(func: t.Callable[[], t.Any]) -> int:
+    """Returns the peak memory, in bytes, allocated while running a
+    function: the greater of the peak traced by `tracemalloc` and the
+    growth in peak resident memory, which also covers allocations made
+    by C libraries such as libxml2. The function is run in a forked
+    process, which starts with a high-water mark equal to its current
+    memory use.
+    """
+    ctx = multiprocessing.get_context("fork")
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_peak_child, args=(func, sender))
+    process.start()
+    peak = receiver.recv()
+    process.join()
+    return peak
+
+
+def run_stage(stage: str, fx: Fixtures, repeat: int, budget: float = 1.0) -> Result:
+    """Measures a stage, running it up to `repeat` times (or fewer if
+    that would take more than `budget` seconds) and keeping the fastest
+    time.
+    """
+    times = list()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func, size = STAGES[stage](fx)
+        while len(times) < repeat and (not times or sum(times) < budget):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+    return Result(len(result), size, min(times), peak_memory(func))
+
+
+def compare(
+    result: Result, baseline: t.Optional[t.Dict[str, t.Any]], tolerance: float
+) -> t.List[str]:
+    """Returns descriptions of any ways in which a result is worse than
+    the baseline by more than the tolerance. Differences of less than a
+    millisecond or a mebibyte are treated as noise.
+    """
+    if baseline is None:
+        return list()
+    problems = list()
+    seconds = baseline["seconds"]
+    if result.seconds > seconds * (1 + tolerance) and result.seconds - seconds > 1e-3:
+        problems.append(f"time {result.seconds / seconds:.2f}x baseline")
+    peak = baseline["peak"]
+    if result.peak > peak * (1 + tolerance) and result.peak - peak > 2**20:
+        problems.append(f"memory {result.peak / max(peak, 1):.2f}x baseline")
+    return problems
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "-s",
+    "--scale",
+    "scales",
+    multiple=True,
+    type=click.IntRange(min=1),
+    default=[1, 10, 100, 1000],
+    show_default=True,
+    help="Number of copies of the test sources to use; may be given more than once.",
+)
+@click.option(
+    "-t",
+    "--stage",
+    "stages",
+    multiple=True,
+    type=click.Choice(list(STAGES)),
+    help="Stage to run (default: all); may be given more than once.",
+)
+@click.option("-r", "--repeat", default=5, show_default=True)
+@click.option(
+    "-b",
+    "--baseline",
+    type=click.Path(dir_okay=False),
+    default=BASELINE_FILE,
+    help="File of baseline results.  [default: benchmarks/baseline.json]",
+)
+@click.option("--save", is_flag=True, help="Save the results as the new baseline.")
+@click.option(
+    "--tolerance",
+    default=0.25,
+    show_default=True,
+    help="Fraction by which a result may exceed the baseline.",
+)
+def main(scales, stages, repeat, baseline, save, tolerance):
+    """Benchmarks the parsing and comparison stages of the test harness.
+
+    Fails if any stage is slower or uses more memory than recorded in
+    the baseline, beyond the tolerance. Baselines depend on the machine,
+    so none is provided: record one first with --save.
+    """
+    check.target_index.enabled = False
+    check.build_cache.enabled = False
+    stages = stages or list(STAGES)
+    baselines = dict()
+    if os.path.isfile(baseline):
+        with open(baseline) as f:
+            baselines = json.load(f)
+    elif not save:
+        click.echo(
+            f"No baseline in {baseline}, so regressions cannot be detected; "
+            "run with --save to record one."
+        )
+
+    results = dict()
+    regressions = list()
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as dirname:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fx = Fixtures(dirname, scale)
+            for stage in stages:
+                name = f"{stage}@{scale}x"
+                result = run_stage(stage, fx, repeat)
+                results[name] = result._asdict()
+                problems = list()
+                if not save:
+                    problems = compare(result, baselines.get(name), tolerance)
+                click.echo(
+                    f"{name:28} {result.entries:7} items "
+                    f"{result.size / 2**20:8.2f} MiB "
+                    f"{result.seconds * 1000:10.1f} ms "
+                    f"{result.throughput():8.1f} MiB/s "
+                    f"{result.peak / 2**20:8.1f} MiB peak"
+                    + (f"  REGRESSION: {', '.join(problems)}" if problems else "")
+                )
+                if problems:
+                    regressions.append(name)
+
+    if save:
+        baselines.update(results)
+        with open(baseline, "w") as f:
+            json.dump(baselines, f, indent=2)
+        click.echo(f"Saved baseline to {baseline}.")
+    elif regressions:
+        raise click.ClickException(
+            f"Regressions against baseline: {', '.join(regressions)}."
+        )
+
+
+if __name__ == "__main__":
+    main()
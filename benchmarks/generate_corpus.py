@@ -0,0 +1,293 @@
+#! /usr/bin/env python3
+"""Generates a synthetic test corpus of any size for load-testing the
+harness, by making variants of the example entries for each template in
+`metamodel.yaml`. Each variant has a new ID and, where they can be
+changed consistently across all sources, a new first author surname and
+year. The corpus is written in the same forms as the real test sources:
+
+- `corpus.yaml`: CSL-YAML database, like `csl/bath-csl-test.yaml`;
+- `corpus.tex`: citations and targets, like `csl/bath-csl-test.tex`;
+- `corpus-bst.dtx` and `corpus-biblatex.dtx`: `bibexbox` blocks, like
+  the DTX files for the BibTeX and biblatex styles;
+- `corpus-bst.bib` and `corpus-biblatex.bib`: the corresponding BibTeX
+  records.
+
+Variants are seeded by the seed, template and number of the variant,
+so a larger corpus extends a smaller one made with the same seed.
+"""
+
+import os
+from pathlib import Path
+import random
+import re
+import sys
+import typing as t
+
+import click
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from processor import load_model  # noqa: E402
+
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+DTX_FILES = {
+    "bst": os.path.join(ROOT, "bst", "bath-bst.dtx"),
+    "biblatex": os.path.join(ROOT, "biblatex", "biblatex-bath.dtx"),
+}
+CREATOR_FIELDS = ["author", "editor", "translator", "director", "composer"]
+
+_BIBEXBOX = re.compile(
+    r"^\\begin\{bibexbox\}[^{]*\{(?P<id>[^}]*)\}.*?^\\end\{bibexbox\}\n",
+    re.MULTILINE | re.DOTALL,
+)
+_GUARDED = re.compile(
+    r"^%<\*(?P<guards>[^>]*)>\n(?P<text>.*?)^%</(?P=guards)>\n",
+    re.MULTILINE | re.DOTALL,
+)
+_CITE = re.compile(r"\\cite\{(?P<id>[^}]*)\}")
+_SYLLABLES = [
+    "al", "ber", "cor", "dan", "el", "fin", "gar", "hol", "is", "jen",
+    "kal", "lor", "mon", "nel", "or", "par", "quin", "ros", "sten", "tal",
+    "ur", "van", "wes", "yor", "zel",
+]  # fmt: skip
+
+
+class Example(t.NamedTuple):
+    """Forms taken by an example entry in the test sources. Forms not
+    present in a source are None.
+    """
+
+    item: t.Optional[str]
+    paragraphs: t.Optional[str]
+    blocks: t.Dict[str, t.Optional[str]]
+    records: t.Dict[str, t.Optional[str]]
+
+    def texts(self) -> t.List[str]:
+        return [
+            text
+            for text in (
+                self.item,
+                self.paragraphs,
+                *self.blocks.values(),
+                *self.records.values(),
+            )
+            if text is not None
+        ]
+
+
+def dtx_examples(filepath: str) -> t.Tuple[t.Dict[str, str], t.Dict[str, str]]:
+    """Returns the first `bibexbox` block for each entry in a DTX file,
+    and the BibTeX record in it that is written to the `.bib` file.
+    """
+    with open(filepath) as f:
+        text = f.read()
+    blocks = dict()
+    records = dict()
+    for m in _BIBEXBOX.finditer(text):
+        key = m.group("id")
+        if key in blocks:
+            continue
+        blocks[key] = m.group()
+        for g in _GUARDED.finditer(m.group()):
+            if "bib" in g.group("guards").split("|") and "@" in g.group("text"):
+                records[key] = g.group("text")
+                break
+    return blocks, records
+
+
+def tex_examples(filepath: str) -> t.Dict[str, str]:
+    """Returns the citation and target paragraphs for each entry cited
+    on its own in a CSL test document.
+    """
+    with open(filepath) as f:
+        paragraphs = re.split(r"\n\s*\n", f.read())
+    examples = dict()
+    for i, paragraph in enumerate(paragraphs[:-1]):
+        keys = _CITE.findall(paragraph)
+        if len(keys) == 1 and paragraph.count("\n") == 0:
+            examples[keys[0]] = f"{paragraph}\n\n{paragraphs[i + 1].strip()}\n"
+    return examples
+
+
+def load_examples() -> t.Dict[str, Example]:
+    """Returns the forms taken by each example entry."""
+    with open(os.path.join(ROOT, "csl", "bath-csl-test.yaml")) as f:
+        references = yaml.load(f, Loader=yaml.CSafeLoader)["references"]
+    items = {
+        ref["id"]: yaml.dump(
+            [ref],
+            Dumper=yaml.CSafeDumper,
+            allow_unicode=True,
+            sort_keys=False,
+            width=2**30,
+        )
+        for ref in references
+    }
+    paragraphs = tex_examples(os.path.join(ROOT, "csl", "bath-csl-test.tex"))
+    dtx = {name: dtx_examples(filepath) for name, filepath in DTX_FILES.items()}
+
+    keys = set(items) | set(paragraphs)
+    for blocks, _ in dtx.values():
+        keys.update(blocks)
+    return {
+        key: Example(
+            items.get(key),
+            paragraphs.get(key),
+            {name: blocks.get(key) for name, (blocks, _) in dtx.items()},
+            {name: records.get(key) for name, (_, records) in dtx.items()},
+        )
+        for key in keys
+    }
+
+
+def first_creator(item: t.Optional[str]) -> t.Optional[str]:
+    """Returns the family name of the first creator of a CSL-YAML item."""
+    if item is None:
+        return None
+    ref = yaml.load(item, Loader=yaml.CSafeLoader)[0]
+    for field in CREATOR_FIELDS:
+        if ref.get(field):
+            return ref[field][0].get("family")
+    return None
+
+
+def issued_year(item: t.Optional[str]) -> t.Optional[str]:
+    """Returns the year of issue of a CSL-YAML item."""
+    if item is None:
+        return None
+    ref = yaml.load(item, Loader=yaml.CSafeLoader)[0]
+    try:
+        return str(ref["issued"]["date-parts"][0][0])
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+def word_pattern(word: str) -> t.Pattern:
+    """Returns pattern matching a word that is not part of an ID."""
+    return re.compile(rf"(?<![\w.:-]){re.escape(word)}(?![\w:-])")
+
+
+def make_variant(
+    example: Example, key: str, new_key: str, rng: random.Random
+) -> Example:
+    """Returns a copy of an example with a new ID and, where they appear
+    in every form of the example, a new first author surname and year.
+    """
+    subs = [(word_pattern(key), new_key)]
+    texts = example.texts()
+    surname = first_creator(example.item)
+    if surname and all(word_pattern(surname).search(text) for text in texts):
+        new_surname = "".join(rng.choices(_SYLLABLES, k=rng.randint(2, 3)))
+        subs.append((word_pattern(surname), new_surname.capitalize()))
+    year = issued_year(example.item)
+    if year:
+        pattern = re.compile(rf"(?<![\w.:-]){year}(?!\d)")
+        if all(pattern.search(text) for text in texts):
+            subs.append((pattern, str(rng.randint(1950, 2024))))
+
+    def apply(text: t.Optional[str]) -> t.Optional[str]:
+        if text is None:
+            return None
+        for pattern, repl in subs:
+            text = pattern.sub(lambda _: repl, text)
+        return text
+
+    return Example(
+        apply(example.item),
+        apply(example.paragraphs),
+        {name: apply(block) for name, block in example.blocks.items()},
+        {name: apply(record) for name, record in example.records.items()},
+    )
+
+
+def generate(
+    count: int, seed: int, templates: t.Iterable[str] = ()
+) -> t.Iterator[t.Tuple[str, Example]]:
+    """Yields `count` variants for each template (default: all) that
+    has example entries, cycling through its examples.
+    """
+    index, _, _ = load_model(Path(ROOT) / "metamodel.yaml")
+    examples = load_examples()
+    for name in templates:
+        if name not in index.templates:
+            raise click.BadParameter(f"No such template: {name}.")
+    for name in templates or index.templates:
+        keys = [key for key in index.templates[name].entries if key in examples]
+        if not keys:
+            click.echo(f"No examples of template {name}; skipping.", err=True)
+            continue
+        slug = re.sub(r"\W+", "-", name)
+        for i in range(count):
+            key = keys[i % len(keys)]
+            rng = random.Random(f"{seed}:{name}:{i}")
+            new_key = f"syn.{slug}.{i}"
+            yield new_key, make_variant(examples[key], key, new_key, rng)
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "-n",
+    "--count",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="Number of entries to generate per template.",
+)
+@click.option("-s", "--seed", default=0, show_default=True)
+@click.option(
+    "-t",
+    "--template",
+    "templates",
+    multiple=True,
+    help="Template to generate entries for (default: all); may be given "
+    "more than once.",
+)
+@click.option(
+    "-o",
+    "--outdir",
+    type=click.Path(file_okay=False),
+    default="corpus",
+    show_default=True,
+    help="Directory to write the corpus to.",
+)
+def main(count, seed, templates, outdir):
+    """Generates a synthetic corpus of test entries from the templates
+    in `metamodel.yaml`.
+    """
+    os.makedirs(outdir, exist_ok=True)
+
+    def path(filename: str) -> str:
+        return os.path.join(outdir, filename)
+
+    files = {
+        "yaml": open(path("corpus.yaml"), "w", encoding="utf-8"),
+        "tex": open(path("corpus.tex"), "w", encoding="utf-8"),
+    }
+    for name in DTX_FILES:
+        files[f"{name}.dtx"] = open(path(f"corpus-{name}.dtx"), "w", encoding="utf-8")
+        files[f"{name}.bib"] = open(path(f"corpus-{name}.bib"), "w", encoding="utf-8")
+    total = 0
+    try:
+        files["yaml"].write("---\nreferences:\n")
+        for _, variant in generate(count, seed, templates):
+            total += 1
+            if variant.item is not None:
+                files["yaml"].write(variant.item + "\n")
+            if variant.paragraphs is not None:
+                files["tex"].write(variant.paragraphs + "\n\n")
+            for name in DTX_FILES:
+                if variant.blocks[name] is not None:
+                    files[f"{name}.dtx"].write(variant.blocks[name] + "\n")
+                if variant.records[name] is not None:
+                    files[f"{name}.bib"].write(variant.records[name] + "\n")
+        files["yaml"].write("...\n")
+    finally:
+        for f in files.values():
+            f.close()
+    click.echo(f"Generated {total} entries in {outdir}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Implementation of `check.parse_bibitems` as it was before the
+tokenizer rewrite, kept as a baseline for benchmarks.
+"""
+import re
+import typing as t
+
+
+def parse_bibitems_charwise(lines: t.List[str]) -> t.Dict[str, str]:
+    """Parses the output from BibTeX and returns a mapping of IDs to
+    actual bibitem output.
+    """
+
+    outputs = dict()
+
+    NORMAL = 0
+    CS = 1
+    GOBBLE = 2
+    state = [NORMAL]
+    level = 1
+    exit_args = [0]
+    exit_gobbles = [0]
+    buffer = ""
+    current_id = None
+    for line in lines:
+        if current_id is None:
+            if m := re.search(r"\\bibitem\[.*\]\{(?P<id>[^}]*)\}$", line):
+                current_id = m.group("id")
+                outputs[current_id] = ""
+            continue
+        elif line == "":
+            outputs[current_id] = re.sub(
+                r", (\d{4})[ab]\. ", r", \1. ", outputs[current_id]
+            )
+            current_id = None
+            state = [NORMAL]
+            level = 1
+            exit_args = [0]
+            exit_gobbles = [0]
+            continue
+
+        line = (
+            line.replace("\\@", "")
+            .replace("\\newblock ", "")
+            .replace("\\urlprefix", "Available from: ")
+            .replace("\\urldateprefix{}", "Accessed ")
+            .replace("\\#", "#")
+            .replace("\\pounds ", "£")
+            .replace("~", " ")
+            .replace("\\noop{h}", "")
+        )
+        line = re.sub(r"\{\\natexlab\{([^}]*)\}\}", r"\1", line)
+
+        if outputs[current_id]:
+            outputs[current_id] += " "
+
+        for char in line:
+            if state[-1] == NORMAL:
+                if char == "\\":
+                    state.append(CS)
+                    outputs[current_id] += buffer
+                    buffer = ""
+                if char == "{":
+                    level += 1
+                    continue
+                elif char == "}":
+                    level -= 1
+                    if level == exit_args[-1]:
+                        exit_args.pop()
+                    else:
+                        continue
+            elif state[-1] == CS:
+                if char == " ":
+                    state.pop()
+                    outputs[current_id] += buffer
+                    buffer = ""
+                elif char == "{":
+                    state.pop()
+                    if buffer == "\\bibinfo":
+                        state.append(GOBBLE)
+                        exit_gobbles.append(level)
+                        level += 1
+                        buffer = ""
+                        continue
+                    exit_args.append(level)
+                    level += 1
+                    outputs[current_id] += buffer
+                    buffer = ""
+                elif char == "}":
+                    if buffer == "\\relax":
+                        buffer = ""
+                    state.pop()
+                    level -= 1
+                    if level == exit_args[-1]:
+                        exit_args.pop()
+                    else:
+                        continue
+            elif state[-1] == GOBBLE:
+                if char == "{":
+                    level += 1
+                elif char == "}":
+                    level -= 1
+                    if level == exit_gobbles[-1]:
+                        exit_gobbles.pop()
+                        state.pop()
+                continue
+
+            buffer += char
+
+        outputs[current_id] += buffer
+        buffer = ""
+
+    return outputs
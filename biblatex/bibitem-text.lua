@@ -0,0 +1,141 @@
+-- Writes the text of the bibliography typeset by biblatex2bibitem straight
+-- to a file, so the test output can be read without producing a PDF and
+-- running pdftotext over it. The records are written as pdftotext extracts
+-- them: a `\bibitem{key}` line, the formatted reference, then `{}` and a
+-- blank line to end the record. Paragraphs are captured before line
+-- breaking, so each reference is on one line and there are no page breaks.
+
+local bibitemtext = {}
+
+local GLYPH = node.id("glyph")
+local GLUE = node.id("glue")
+local DISC = node.id("disc")
+local HLIST = node.id("hlist")
+local VLIST = node.id("vlist")
+
+-- Glue subtypes for interword spaces: user skips, \spaceskip, \xspaceskip
+local SPACES = { [0] = true, [13] = true, [14] = true }
+
+local output = nil
+
+local function decode_tounicode(hex)
+  local chars = {}
+  local i = 1
+  while i + 3 <= #hex do
+    local code = tonumber(hex:sub(i, i + 3), 16)
+    i = i + 4
+    if code >= 0xD800 and code < 0xDC00 and i + 3 <= #hex then
+      local low = tonumber(hex:sub(i, i + 3), 16)
+      i = i + 4
+      code = 0x10000 + (code - 0xD800) * 0x400 + (low - 0xDC00)
+    end
+    chars[#chars + 1] = utf8.char(code)
+  end
+  return table.concat(chars)
+end
+
+local nodes_text
+
+local function glyph_text(n)
+  if n.components then
+    -- Ligature made by TeX itself
+    return nodes_text(n.components)
+  end
+  local f = font.getfont(n.font)
+  local c = f and f.characters and f.characters[n.char]
+  if c then
+    -- Ligatures and variants made by the font loader
+    if type(c.unicode) == "number" then
+      return utf8.char(c.unicode)
+    elseif type(c.unicode) == "table" then
+      return utf8.char(table.unpack(c.unicode))
+    elseif type(c.tounicode) == "string" then
+      return decode_tounicode(c.tounicode)
+    end
+  end
+  if n.char < 0xF0000 then
+    return utf8.char(n.char)
+  end
+  return ""
+end
+
+nodes_text = function(head)
+  local parts = {}
+  for n in node.traverse(head) do
+    if n.id == GLYPH then
+      parts[#parts + 1] = glyph_text(n)
+    elseif n.id == GLUE then
+      if SPACES[n.subtype] then
+        parts[#parts + 1] = " "
+      end
+    elseif n.id == DISC then
+      parts[#parts + 1] = nodes_text(n.replace)
+    elseif n.id == HLIST or n.id == VLIST then
+      parts[#parts + 1] = nodes_text(n.head or n.list)
+    end
+  end
+  return table.concat(parts)
+end
+
+-- Record being captured: its `\bibitem` line and the text so far
+local record = nil
+
+local function flush()
+  if record then
+    output:write(record.key, "\n")
+    if #record.parts > 0 then
+      output:write(table.concat(record.parts, " "), "\n")
+    end
+    output:write("{}\n\n")
+    record = nil
+  end
+end
+
+local function capture(head)
+  if output then
+    local text = nodes_text(head):gsub("%s+", " "):gsub("^ ", ""):gsub(" $", "")
+    local key, rest = text:match("^(\\bibitem%b[]%b{}) ?(.*)$")
+    if not key then
+      key, rest = text:match("^(\\bibitem%b{}) ?(.*)$")
+    end
+    if key then
+      flush()
+      record = { key = key, parts = {} }
+      text = rest
+    end
+    -- biblatex2bibitem ends each record with an empty group
+    local body, ended = text:match("^(.-) ?({})$")
+    if ended then
+      text = body
+    end
+    if text ~= "" then
+      if record then
+        record.parts[#record.parts + 1] = text
+      else
+        output:write(text, "\n")
+      end
+    end
+    if ended then
+      flush()
+    end
+  end
+  return true
+end
+
+luatexbase.add_to_callback("pre_linebreak_filter", capture, "bibitem-text")
+
+-- Starts writing the text of paragraphs to the named file.
+function bibitemtext.start(filename)
+  output = assert(io.open(filename, "w"))
+end
+
+-- Stops writing and closes the file.
+function bibitemtext.stop()
+  if output then
+    flush()
+    output:close()
+    output = nil
+  end
+end
+
+return bibitemtext
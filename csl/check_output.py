@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+
+"""
+This script processes the output of a CSL conversion process to generate a
+tidy HTML page; classes are applied according to whether the expected output
+was produced.
+
+Usage: check_output.py INPUT-FILE OUTPUT-FILE
+
+Two modes of operation are supported:
+
+1.  INPUT-FILE = *.html
+
+    The input file must be the output of a conversion from LaTeX to HTML by
+    pandoc, using its in-built citeproc implementation.
+
+    Pandoc's output changed slightly at about the same time as it switched
+    from using an external `pandoc-citeproc` executable to a built-in copy of
+    the Haskell `citeproc` library, so this code requires pandoc version 2.11+
+    (or thereabouts).
+
+2.  INPUT-FILE = <stem>-output.json
+
+    The input file must be the output of a JSON-to-JSON conversion by
+    citeproc-js (via citeproc-js-server). In the same directory as the
+    INPUT-FILE there should also be <stem>-raw.html (the pandoc output
+    used as the INPUT-FILE in mode 1, above) and <stem>-input.json
+    (the JSON that was sent to citeproc-js).
+
+    What happens is that <stem>-raw.html is processed just the same as in
+    mode 1, except that the generated content in it is ignored in favour of the
+    content from <stem>-output.json. The <stem>-input.json is used to resolve
+    citation order, as this isn't preserved in the conversion.
+
+3.  INPUT-FILE = <stem>-input.json
+
+    If the input file is a manifest written by `yaml2json.py` when
+    splitting the request for citeproc-js into shards, <stem>-raw.html is
+    processed as in mode 2, but the generated content is taken from the
+    outputs of the shards listed in the manifest, which are stitched back
+    together in the original citation order. Otherwise the input file is
+    taken to be the request sent to citeproc-js, and the check proceeds as
+    in mode 2 with <stem>-output.json.
+
+The same can be done from Python with `write_report`. The parsed form of
+<stem>-raw.html is kept in memory, so generating both reports in one
+process only reads and parses it once.
+"""
+
+import json
+import os
+import re
+import threading
+import typing as t
+
+import click
+
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+
+_CITATION = re.compile(r'data-cites="(?P<id>[^"]+)">(?P<gen>\(.+\))</span>')
+_EXPECTED = re.compile(r"(?P<exp>\(.+\)) = ")
+_REF_ID = re.compile(r'id="ref-(?P<id>[^"]+)"')
+_PANDOC_REF_SUBS = [
+    (re.compile(r"<span>([“‘].*?[’”])</span>"), r"\1"),
+    (re.compile(r'<span class="nocase">([^<]*)</span>'), r"\1"),
+    (re.compile(r'<a href="(.*?)">'), r'<a href="\1" class="uri">'),
+    (re.compile(r"<em>([^<]*)<i>([^<]*)</i>([^<]*)</em>"), r"<em>\1<em>\2</em>\3</em>"),
+]
+_CPJS_SUBS = [
+    (re.compile(r'<a href=\\"([^"]+)\\">'), r'<a href=\\"\1\\" class=\\"uri\\">'),
+    (re.compile(r"<(/?)i>"), r"<\1em>"),
+    (
+        re.compile(
+            r'<em>([^<]*)<span style=\\"font-style:normal;\\">([^<]*)</span>([^<]*)</em>'
+        ),
+        r"<em>\1<em>\2</em>\3</em>",
+    ),
+]
+_BNF_REF_YEAR = re.compile(r"(\d{4})[ab]\.")
+_BNF_CITE_YEAR = re.compile(r"(\d{4})[ab]\)")
+
+
+class Text(t.NamedTuple):
+    """Line of raw HTML copied to the report as is."""
+
+    line: str
+
+
+class Citation(t.NamedTuple):
+    """Test citation and the target bibliography entry that follows it."""
+
+    entryid: str
+    line: str
+    gen: t.Optional[str]
+    expected: t.Optional[str]
+    target: t.Optional[str]
+
+
+class Reference(t.NamedTuple):
+    """Bibliography entry generated by pandoc. `head` holds the lines
+    preceding the entry's content, `body` the content as tidied for
+    comparison (or None if it had none) and `tail` the closing line.
+    """
+
+    entryid: str
+    matched: bool
+    head: str
+    body: t.Optional[str]
+    tail: str
+
+
+class RefsEnd(t.NamedTuple):
+    """Closing line of a bibliography."""
+
+    line: str
+
+
+Token = t.Union[Text, Citation, Reference, RefsEnd]
+
+_parsed: t.Dict[str, t.Tuple[t.Tuple[int, int], t.List[Token]]] = dict()
+_parsed_lock = threading.Lock()
+
+
+def tidy_pandoc_ref(line: str) -> str:
+    """Normalises a bibliography entry generated by pandoc to the form
+    used in the test document.
+    """
+    line = line.replace('href="https://lis-link@', 'href="lis-link@')
+    for pattern, repl in _PANDOC_REF_SUBS:
+        line = pattern.sub(repl, line)
+    return f"<p>{line.strip()}</p>\n"
+
+
+def parse_raw(lines: t.Iterable[str]) -> t.List[Token]:
+    """Parses pandoc HTML output into a list of tokens from which
+    reports can be rendered.
+    """
+    tokens: t.List[Token] = list()
+    state = "normal"
+    entryid = "error"
+    gen = None
+    cite = None
+    head = list()
+    body = None
+
+    for line in lines:
+        if state == "normal":
+            if '<span class="citation"' in line:
+                m1 = _CITATION.search(line)
+                if m1:
+                    entryid = m1.group("id")
+                    gen = m1.group("gen")
+                m2 = _EXPECTED.search(line)
+                cite = Citation(
+                    entryid, line, gen, m2.group("exp") if m2 else None, None
+                )
+                state = "test"
+            elif line.startswith('<div id="refs"'):
+                state = "refs"
+            else:
+                tokens.append(Text(line))
+        elif state == "test":
+            if line.startswith("<p>"):
+                cite = cite._replace(target=line)
+            if line.endswith("</p>\n"):
+                tokens.append(cite)
+                state = "normal"
+        elif state == "refs":
+            if line.startswith('<div id="ref-'):
+                m = _REF_ID.search(line)
+                if m:
+                    entryid = m.group("id")
+                matched = m is not None
+                head.append(line)
+                body = None
+                state = "generated"
+            elif line.startswith("</div>"):
+                tokens.append(RefsEnd(line))
+                state = "normal"
+            else:
+                head.append(line)
+        elif state == "generated":
+            if line.startswith("</div>"):
+                tokens.append(Reference(entryid, matched, "".join(head), body, line))
+                head = list()
+                state = "refs"
+            elif body is None:
+                body = tidy_pandoc_ref(line)
+
+    return tokens
+
+
+def parse_raw_html(filepath: str) -> t.List[Token]:
+    """Returns tokens parsed from pandoc HTML output, reusing the
+    result of an earlier call if the file has not changed since.
+    """
+    stat = os.stat(filepath)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _parsed_lock:
+        if filepath in _parsed and _parsed[filepath][0] == version:
+            return _parsed[filepath][1]
+        with open(filepath) as f:
+            tokens = parse_raw(f)
+        _parsed[filepath] = (version, tokens)
+    return tokens
+
+
+def load_citeproc_output(
+    output_json: str, input_json: str
+) -> t.Tuple[t.Dict[str, str], t.Dict[str, str]]:
+    """Returns bibliography entries and citations generated by
+    citeproc-js, mapped from entry IDs and tidied for comparison.
+    """
+    with open(input_json) as f:
+        in_data = json.load(f)
+
+    citation_order = [item["id"] for item in in_data["items"]]
+    return read_citeproc_output(output_json, citation_order)
+
+
+def load_sharded_output(
+    manifest_json: str,
+) -> t.Tuple[t.Dict[str, str], t.Dict[str, str]]:
+    """Returns bibliography entries and citations generated by
+    citeproc-js for the shards listed in a manifest written by
+    `yaml2json.py`, stitched back together in the original order.
+    """
+    with open(manifest_json) as f:
+        manifest = json.load(f)
+
+    dirname = os.path.dirname(manifest_json)
+    refs = dict()
+    shard_cites = dict()
+    for shard in manifest["shards"]:
+        shard_refs, cites = read_citeproc_output(
+            os.path.join(dirname, shard["output"]), shard["ids"]
+        )
+        refs.update(shard_refs)
+        shard_cites.update(cites)
+
+    cites = {id: shard_cites[id] for id in manifest["ids"] if id in shard_cites}
+    return refs, cites
+
+
+def is_manifest(filepath: str) -> bool:
+    """Returns whether a JSON file is a manifest of shards written by
+    `yaml2json.py`, rather than a request for citeproc-js.
+    """
+    try:
+        with open(filepath) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return isinstance(data, dict) and "shards" in data
+
+
+def shard_outputs(manifest_json: str) -> t.List[str]:
+    """Returns paths to the outputs of the shards listed in a manifest."""
+    with open(manifest_json) as f:
+        manifest = json.load(f)
+    dirname = os.path.dirname(manifest_json)
+    return [os.path.join(dirname, shard["output"]) for shard in manifest["shards"]]
+
+
+def read_citeproc_output(
+    output_json: str, citation_order: t.List[str]
+) -> t.Tuple[t.Dict[str, str], t.Dict[str, str]]:
+    """Returns bibliography entries and citations from a citeproc-js
+    response, given the IDs of the items cited in each cluster.
+    """
+    with open(output_json) as f:
+        cpjs_output = f.read()
+
+    if cpjs_output.startswith("Error"):
+        os.remove(output_json)
+        raise RuntimeError(
+            f"citeproc-js-server conversion failed: {cpjs_output.strip()}"
+        )
+
+    cpjs_output = (
+        cpjs_output.replace(r"  <div class=\"csl-entry\">", "<p>")
+        .replace("&#38;", "&amp;")
+        .replace("1981-01–07", "1981-01-07")
+        .replace("https://doi.org/lis-link", "lis-link")
+        .replace("</div>", "</p>")
+    )
+    for pattern, repl in _CPJS_SUBS:
+        cpjs_output = pattern.sub(repl, cpjs_output)
+
+    out_data = json.loads(cpjs_output)
+
+    bibliography_order = [item[0] for item in out_data["bibliography"][0]["entry_ids"]]
+    references = out_data["bibliography"][1]
+    citations = [item[1] for item in out_data["citations"]]
+
+    refs = dict()
+    for entryid, ref in zip(bibliography_order, references):
+        if "British National Formulary" in ref:
+            ref = _BNF_REF_YEAR.sub(r"\1.", ref)
+        refs[entryid] = ref
+
+    cites = dict()
+    for entryid, cite in zip(citation_order, citations):
+        if "British National Formulary" in cite:
+            cite = _BNF_CITE_YEAR.sub(r"\1)", cite)
+        cites[entryid] = cite
+
+    return refs, cites
+
+
+def render_report(
+    tokens: t.Iterable[Token],
+    f: t.TextIO,
+    refs: t.Optional[t.Dict[str, str]] = None,
+    cites: t.Optional[t.Dict[str, str]] = None,
+) -> None:
+    """Writes HTML report to a file object. If given, `refs` and
+    `cites` are used in place of the bibliography entries and citations
+    generated by pandoc.
+    """
+    refs = dict(refs or {})
+    cites = cites or {}
+    targets = dict()
+    target_strings = dict()
+    div_depth = 0
+
+    for token in tokens:
+        if isinstance(token, Text):
+            f.write(token.line)
+        elif isinstance(token, Citation):
+            entryid = token.entryid
+            line = token.line
+            gen = token.gen
+            if entryid in cites:
+                line = line.replace(f">{gen}</span>", f">{cites[entryid]}</span>")
+                gen = cites[entryid]
+            cite_comp = ""
+            if token.expected is not None:
+                test_gen = gen.replace('<span class="nocase">', "").replace(
+                    "</span>", ""
+                )
+                cite_comp = " success" if test_gen == token.expected else " failure"
+            target_strings[entryid] = (
+                f'<div class="test">\n<div class="citation{cite_comp}">\n'
+                f"{line}</div>\n"
+            )
+            if token.target is not None:
+                targets[entryid] = token.target
+        elif isinstance(token, Reference):
+            entryid = token.entryid
+            while div_depth:
+                f.write("</div>\n")
+                div_depth -= 1
+            if token.matched:
+                f.write(target_strings.get(entryid, ""))
+                div_depth += 1
+            if entryid not in refs and token.body is not None:
+                refs[entryid] = token.body
+            ref_comp = ""
+            if entryid in targets:
+                ref_comp = (
+                    " success" if targets[entryid] == refs[entryid] else " failure"
+                )
+            f.write(f'<div class="target{ref_comp}">\n')
+            f.write(targets.get(entryid, ""))
+            f.write("</div>\n")
+            f.write(f'<div class="references{ref_comp}">\n')
+            f.write(token.head)
+            f.write(refs.get(entryid, ""))
+            f.write(token.tail)
+            f.write(token.tail)
+        elif isinstance(token, RefsEnd):
+            f.write(token.line)
+            div_depth -= 1
+
+
+def write_report(
+    raw_html: str,
+    outfile: str,
+    citeproc_output: t.Optional[str] = None,
+    manifest: t.Optional[str] = None,
+) -> None:
+    """Generates HTML report from pandoc output or, if the path to
+    <stem>-output.json or to a manifest of shards is given, from
+    citeproc-js output.
+    """
+    refs, cites = None, None
+    if manifest is not None:
+        refs, cites = load_sharded_output(manifest)
+    elif citeproc_output is not None:
+        refs, cites = load_citeproc_output(
+            citeproc_output, citeproc_output.replace("-output", "-input")
+        )
+    tokens = parse_raw_html(raw_html)
+    with open(outfile, "w") as f:
+        render_report(tokens, f, refs=refs, cites=cites)
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.argument("infile", metavar="FILE")
+@click.argument("outfile", metavar="FILE")
+def main(infile, outfile):
+    """
+    Performs checks on input (HTML or JSON) and generates HTML output.
+    """
+    required = [infile]
+    citeproc_output = None
+    manifest = None
+    raw_html = infile
+    if infile.endswith("-input.json") and is_manifest(infile):
+        manifest = infile
+        raw_html = infile.replace("-input.json", "-raw.html")
+        required.append(raw_html)
+        required.extend(shard_outputs(manifest))
+    elif infile.endswith(".json"):
+        citeproc_output = infile.replace("-input.json", "-output.json")
+        raw_html = citeproc_output.replace("-output.json", "-raw.html")
+        required.extend(
+            [raw_html, citeproc_output, citeproc_output.replace("-output", "-input")]
+        )
+    for filepath in required:
+        if not os.path.isfile(filepath):
+            raise click.ClickException(
+                f"Please generate {filepath} before running this script."
+            )
+
+    click.echo("Checking test output for variance...")
+    write_report(raw_html, outfile, citeproc_output=citeproc_output, manifest=manifest)
+    click.echo("Finished!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#! /usr/bin/env python3
+import asyncio
+from http.client import HTTPConnection, HTTPException
+import json
+import typing as t
+from urllib.parse import urlencode, urlsplit
+
+import click
+
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+DEFAULT_URL = "http://127.0.0.1:8085"
+QUERY = {
+    "responseformat": "json",
+    "locale": "en-GB",
+    "linkwrap": "1",
+    "citations": "1",
+}
+CREATOR_FIELDS = ["author", "editor", "translator", "director", "composer"]
+
+
+class CiteprocError(Exception):
+    pass
+
+
+def disambiguation_key(item: t.Dict[str, t.Any]) -> str:
+    """Returns key shared by items that citeproc may need to
+    disambiguate from one another: the first name used in citations,
+    or failing that the title.
+    """
+    for field in CREATOR_FIELDS:
+        names = item.get(field)
+        if names:
+            name = names[0]
+            return str(name.get("family") or name.get("literal", "")).lower()
+    return str(item.get("title", "")).lower()
+
+
+def chunk_items(
+    items: t.List[t.Dict[str, t.Any]], size: int
+) -> t.List[t.List[t.Dict[str, t.Any]]]:
+    """Splits items into chunks of roughly the given size, keeping items
+    with the same disambiguation key in the same chunk so that year
+    suffixes and other disambiguation are resolved as for a single
+    request.
+    """
+    groups = dict()
+    for item in items:
+        groups.setdefault(disambiguation_key(item), list()).append(item)
+
+    chunks = list()
+    chunk = list()
+    for group in groups.values():
+        if chunk and len(chunk) + len(group) > size:
+            chunks.append(chunk)
+            chunk = list()
+        chunk.extend(group)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def make_request(
+    items: t.List[t.Dict[str, t.Any]], style_xml: t.Optional[str]
+) -> t.Dict[str, t.Any]:
+    """Returns citeproc-js-server request for the given items, with a
+    citation cluster for each one.
+    """
+    request = {
+        "items": items,
+        "citationClusters": [
+            {
+                "citationItems": [{"id": item["id"]}],
+                "properties": {"noteIndex": i},
+            }
+            for i, item in enumerate(items, start=1)
+        ],
+    }
+    if style_xml is not None:
+        request["styleXML"] = style_xml
+    return request
+
+
+def merge_responses(
+    chunks: t.List[t.List[t.Dict[str, t.Any]]],
+    responses: t.List[t.Dict[str, t.Any]],
+    order: t.List[str],
+) -> t.Dict[str, t.Any]:
+    """Merges responses for chunks of items into the form of a single
+    response, with citations in the original order of items.
+    """
+    entry_ids = list()
+    entries = list()
+    citations = dict()
+    for chunk, response in zip(chunks, responses):
+        meta, chunk_entries = response["bibliography"]
+        entry_ids.extend(meta["entry_ids"])
+        entries.extend(chunk_entries)
+        for item, (_, citation) in zip(chunk, response["citations"]):
+            citations[item["id"]] = citation
+
+    bibliography_meta = dict(responses[0]["bibliography"][0]) if responses else {}
+    bibliography_meta["entry_ids"] = entry_ids
+    return {
+        "bibliography": [bibliography_meta, entries],
+        "citations": [[i, citations[id]] for i, id in enumerate(order)],
+    }
+
+
+class ConnectionPool:
+    """Pool of persistent HTTP connections to citeproc-js-server, used
+    from worker threads.
+    """
+
+    def __init__(self, url: str, size: int, timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port
+        self.path = f"{parts.path or '/'}?{urlencode(QUERY)}"
+        self.timeout = timeout
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(
+                HTTPConnection(self.host, self.port, timeout=self.timeout)
+            )
+
+    def _post(self, conn: HTTPConnection, body: bytes) -> str:
+        conn.request(
+            "POST",
+            self.path,
+            body=body,
+            headers={"Content-type": "application/json"},
+        )
+        response = conn.getresponse()
+        data = response.read().decode("utf-8")
+        if response.status != 200 or data.startswith("Error"):
+            raise CiteprocError(data.strip() or f"HTTP status {response.status}")
+        return data
+
+    async def post(self, body: bytes) -> str:
+        conn = await self._idle.get()
+        try:
+            return await asyncio.to_thread(self._post, conn, body)
+        except (OSError, HTTPException):
+            # Discard connection state; it reconnects on next use
+            conn.close()
+            raise
+        finally:
+            self._idle.put_nowait(conn)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+async def fetch_chunks(
+    requests: t.List[t.Dict[str, t.Any]],
+    url: str,
+    concurrency: int,
+    retries: int,
+    timeout: float,
+) -> t.List[t.Dict[str, t.Any]]:
+    """Sends requests concurrently, retrying each failed request with
+    exponential backoff, and returns the decoded responses in order.
+    """
+    pool = ConnectionPool(url, concurrency, timeout)
+
+    async def fetch(request: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+        body = json.dumps(request, ensure_ascii=False).encode("utf-8")
+        for attempt in range(retries + 1):
+            try:
+                return json.loads(await pool.post(body))
+            except (CiteprocError, OSError, HTTPException, ValueError) as e:
+                if attempt == retries:
+                    raise CiteprocError(
+                        f"citeproc-js-server conversion failed: {e}"
+                    ) from e
+                await asyncio.sleep(0.5 * 2**attempt)
+
+    try:
+        return await asyncio.gather(*(fetch(r) for r in requests))
+    finally:
+        pool.close()
+
+
+def convert(
+    data: t.Dict[str, t.Any],
+    url: str = DEFAULT_URL,
+    chunk_size: int = 50,
+    concurrency: int = 4,
+    retries: int = 2,
+    timeout: float = 60.0,
+) -> t.Dict[str, t.Any]:
+    """Converts request data in the form generated by `yaml2json.py`
+    using citeproc-js-server, sending it in chunks of items.
+
+    Returns data in the same form as the response to a single request.
+    """
+    items = data["items"]
+    chunks = chunk_items(items, chunk_size)
+    requests = [make_request(chunk, data.get("styleXML")) for chunk in chunks]
+    responses = asyncio.run(
+        fetch_chunks(requests, url, max(1, concurrency), retries, timeout)
+    )
+    return merge_responses(chunks, responses, [item["id"] for item in items])
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "-o",
+    "--output",
+    type=click.File(mode="w", lazy=True, encoding="utf-8"),
+    default="-",
+    help="Output file (default: STDOUT).",
+)
+@click.option(
+    "-u",
+    "--url",
+    default=DEFAULT_URL,
+    show_default=True,
+    help="Base URL of citeproc-js-server.",
+)
+@click.option(
+    "-n",
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=50,
+    show_default=True,
+    help="Approximate number of items to send per request.",
+)
+@click.option(
+    "-c",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Number of requests to have in progress at once.",
+)
+@click.option(
+    "-r",
+    "--retries",
+    type=click.IntRange(min=0),
+    default=2,
+    show_default=True,
+    help="Number of times to retry a failed request.",
+)
+@click.argument("input", type=click.File(encoding="utf-8"))
+def main(output, url, chunk_size, concurrency, retries, input):
+    """
+    Sends CSL-JSON data generated by `yaml2json.py` to citeproc-js-server
+    and writes the combined response.
+
+    Items are sent in chunks over a pool of persistent connections.
+    Items sharing a first author (or title) are kept together so that
+    they are disambiguated as they would be in a single request.
+    """
+    try:
+        result = convert(
+            json.load(input),
+            url=url,
+            chunk_size=chunk_size,
+            concurrency=concurrency,
+            retries=retries,
+        )
+    except CiteprocError as e:
+        raise click.ClickException(str(e))
+    json.dump(result, output, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#! /usr/bin/env python3
+import os
+import re
+import subprocess
+import tempfile
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+HTML_HEAD = (
+    "<!DOCTYPE html>\n"
+    '<html><head><meta charset="UTF-8"><title>CSL Test Suite of Examples</title>'
+    '<link rel="stylesheet" type="text/css" href="style.css"></head><body>\n'
+)
+HTML_FOOT = "</body></html>\n"
+
+
+def split_examples(text: str) -> t.List[str]:
+    """Splits test document into examples, which are separated by two
+    blank lines. The first example includes the preamble.
+    """
+    return [f"{example}\n" for example in text.split("\n\n\n") if example]
+
+
+def prepare_example(example: str) -> str:
+    """Replaces LaTeX commands that pandoc would not render in the
+    same way as in the expected output.
+    """
+    example = example.replace("\\textup", "\\textrm")
+    return re.sub(r"\\enquote\{([^}]*)\}", r"‘\1’", example)
+
+
+def run(command: t.List[str], input: str) -> subprocess.CompletedProcess:
+    """Runs a command with the given input, capturing its output."""
+    return subprocess.run(command, input=input, capture_output=True, text=True)
+
+
+def render_example(
+    example: str,
+    bibliography: str,
+    style: str,
+    run: t.Callable[[t.List[str], str], subprocess.CompletedProcess] = run,
+) -> str:
+    """Converts example to HTML with pandoc, using its built-in
+    citeproc. The command is run with `run`.
+    """
+    try:
+        r = run(
+            [
+                "pandoc",
+                "--wrap=preserve",
+                "--citeproc",
+                "--bibliography",
+                bibliography,
+                "--variable",
+                "lang=en-GB",
+                "--csl",
+                style,
+                "-f",
+                "latex",
+                "-t",
+                "html5",
+            ],
+            prepare_example(example),
+        )
+    except OSError as e:
+        raise click.ClickException(f"Could not run pandoc: {e}")
+    if r.returncode:
+        first_line = example.strip().split("\n")[0]
+        raise click.ClickException(
+            f"pandoc failed on example starting '{first_line}':\n{r.stderr}"
+        )
+    return r.stdout
+
+
+def render_examples(
+    source: str,
+    bibliography: str,
+    style: str,
+    output: str,
+    jobs: t.Optional[int] = None,
+) -> None:
+    """Renders each example in the LaTeX test document with a separate
+    pandoc process, running up to `jobs` at once, and writes the
+    results in document order to an HTML file.
+    """
+    with open(source) as f:
+        examples = split_examples(f.read())
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Escape @ so pandoc does not treat it as citation syntax
+        tmp_bib = os.path.join(tmpdir, os.path.basename(bibliography))
+        with open(bibliography) as f, open(tmp_bib, "w") as g:
+            g.write(f.read().replace("@", "\\@"))
+
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            parts = list(
+                pool.map(
+                    lambda example: render_example(example, tmp_bib, style),
+                    examples,
+                )
+            )
+
+    with open(output, "w") as f:
+        f.write(HTML_HEAD)
+        for part in parts:
+            f.write(part)
+        f.write(HTML_FOOT)
+
+
+@click.command(context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    required=True,
+    help="HTML file to generate.",
+)
+@click.option(
+    "-b",
+    "--bibliography",
+    type=click.Path(exists=True, dir_okay=False),
+    required=True,
+    help="CSL-YAML database of examples.",
+)
+@click.option(
+    "-s",
+    "--style",
+    type=click.Path(exists=True, dir_okay=False),
+    required=True,
+    help="CSL style file.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="Number of pandoc processes to run at once (default: one per CPU).",
+)
+@click.argument("source", type=click.Path(exists=True, dir_okay=False))
+def main(output, bibliography, style, jobs, source):
+    """
+    Converts the examples in a LaTeX test document to HTML using pandoc
+    and the given CSL style.
+
+    Examples are separated by two blank lines and are rendered
+    independently, so that citations in one do not affect another.
+    """
+    render_examples(source, bibliography, style, output, jobs=jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,28 @@
 #! /usr/bin/env python3
+from contextlib import ExitStack, contextmanager
+import itertools
 import json
+import os
 import re
+import sys
+import typing as t
+import zlib
 
 import click
 import yaml
+from yaml.cyaml import CParser
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.events import (
+    DocumentStartEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+)
+from yaml.resolver import Resolver
+
+from citeproc_client import disambiguation_key
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 NUMBER_FIELDS = [
@@ -28,11 +47,258 @@ NUMBER_FIELDS = [
 ]
 
 
+class StreamingLoader(CParser, Composer, SafeConstructor, Resolver):
+    """Safe YAML loader that can construct a document piece by piece.
+    Events are parsed by LibYAML, while nodes are composed from them
+    in Python so that composition can stop at any depth.
+    """
+
+    def __init__(self, stream: t.TextIO):
+        CParser.__init__(self, stream)
+        Composer.__init__(self)
+        SafeConstructor.__init__(self)
+        Resolver.__init__(self)
+
+    def construct_next(self) -> t.Any:
+        """Composes and constructs the next node in the stream."""
+        return self.construct_document(self.compose_node(None, None))
+
+
+def iter_references(stream: t.TextIO) -> t.Iterator[t.Dict[str, t.Any]]:
+    """Yields the entries of a CSL-YAML database one at a time, without
+    loading the whole database into memory.
+    """
+    loader = StreamingLoader(stream)
+    try:
+        loader.get_event()
+        if loader.check_event(DocumentStartEvent):
+            loader.get_event()
+        if not loader.check_event(MappingStartEvent):
+            raise click.ClickException(
+                message="YAML input should be an object/hash/dictionary with "
+                "a 'references' key."
+            )
+        loader.get_event()
+        found = False
+        while not loader.check_event(MappingEndEvent):
+            key = loader.construct_next()
+            if key != "references":
+                loader.compose_node(None, None)
+                continue
+            if not loader.check_event(SequenceStartEvent):
+                raise click.ClickException(
+                    message="YAML input should be an object/hash/dictionary "
+                    "with a 'references' key that maps to an array/list of "
+                    "entries."
+                )
+            found = True
+            loader.get_event()
+            while not loader.check_event(SequenceEndEvent):
+                yield loader.construct_next()
+            loader.get_event()
+        if not found:
+            raise click.ClickException(
+                message="YAML input should be an object/hash/dictionary with "
+                "a 'references' key."
+            )
+    finally:
+        loader.dispose()
+
+
+def prepare_reference(ref: t.Any) -> t.Dict[str, t.Any]:
+    """Checks an entry and adapts it from pandoc to citeproc-js usage."""
+    # Data quality checks
+    if not isinstance(ref, dict) or "id" not in ref:
+        raise click.ClickException(
+            message="All entries must have an 'id' key/value pair."
+        )
+    for field in NUMBER_FIELDS:
+        if field in ref and isinstance((v := ref[field]), int):
+            print(f"WARNING: {ref['id']} > ‘{field}’ should be input as string.")
+            ref[field] = str(v)
+    # Remove pandoc-specific workaround for escaping underscores in URLs
+    url = ref.get("URL")
+    if url:
+        ref["URL"] = url.replace(r"\_", "_")
+    return ref
+
+
+class RequestWriter:
+    """Writes citeproc-js-server request data, with a citation cluster
+    for each entry, as entries are added. Only the entry IDs are kept
+    in memory.
+
+    The output is the same as dumping the complete request with
+    `json.dump`, indented by two spaces unless `compact` is true.
+    """
+
+    def __init__(
+        self,
+        output: t.TextIO,
+        style_xml: t.Optional[str] = None,
+        compact: bool = False,
+    ):
+        self.output = output
+        self.style_xml = style_xml
+        self.ids: t.List[str] = list()
+        if compact:
+            self.indent, self.sep, self.end = "", ",", ""
+            self.dumps = dict(ensure_ascii=False, separators=(",", ":"))
+        else:
+            self.indent, self.sep, self.end = "\n    ", ",\n    ", "\n  "
+            self.dumps = dict(ensure_ascii=False, indent=2)
+        self.pad = self.indent[:-2]
+        self.space = " " if self.indent else ""
+        self.output.write(f'{{{self.pad}"items":{self.space}[')
+
+    def dump(self, obj: t.Any) -> str:
+        text = json.dumps(obj, **self.dumps)
+        return text.replace("\n", self.indent) if self.indent else text
+
+    def add(self, ref: t.Dict[str, t.Any]) -> None:
+        self.output.write((self.sep if self.ids else self.indent) + self.dump(ref))
+        self.ids.append(ref["id"])
+
+    def close(self) -> None:
+        output = self.output
+        output.write((self.end if self.ids else "") + "]")
+        output.write(f',{self.pad}"citationClusters":{self.space}[')
+        for i, id in enumerate(self.ids, start=1):
+            cluster = {
+                "citationItems": [{"id": id}],
+                "properties": {"noteIndex": i},
+            }
+            output.write((self.sep if i > 1 else self.indent) + self.dump(cluster))
+        output.write((self.end if self.ids else "") + "]")
+        if self.style_xml is not None:
+            output.write(
+                f',{self.pad}"styleXML":{self.space}{self.dump(self.style_xml)}'
+            )
+        output.write(f"{self.pad[:-2]}}}")
+
+
+@contextmanager
+def replace_on_success(filepath: str) -> t.Iterator[t.TextIO]:
+    """Opens a temporary file next to `filepath` for writing, and moves
+    it into place only if the block completes without an error, so that
+    a failed conversion never leaves partial output. If `filepath` is
+    "-", writes to STDOUT instead.
+    """
+    if filepath == "-":
+        yield sys.stdout
+        return
+    tmp = f"{filepath}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            yield f
+        os.replace(tmp, filepath)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_request(
+    refs: t.Iterable[t.Dict[str, t.Any]],
+    output: t.TextIO,
+    style_xml: t.Optional[str] = None,
+    compact: bool = False,
+) -> None:
+    """Writes a single request for all entries as they are read."""
+    # Read up to the first entry before writing anything, so that
+    # problems with the structure of the database leave no output
+    refs = iter(refs)
+    first = next(refs, None)
+
+    writer = RequestWriter(output, style_xml=style_xml, compact=compact)
+    for ref in itertools.chain([first] if first is not None else [], refs):
+        writer.add(ref)
+    writer.close()
+
+
+def shard_filenames(filepath: str, number: int) -> t.Tuple[str, str]:
+    """Returns names of the request file for a shard and of the file
+    its response is expected in, e.g. `x-input-2.json` and
+    `x-output-2.json` for shard 2 of `x-input.json`.
+    """
+    stem, ext = os.path.splitext(os.path.basename(filepath))
+    request = f"{stem}-{number}{ext}"
+    if stem.endswith("-input"):
+        response = f"{stem[:-6]}-output-{number}{ext}"
+    else:
+        response = f"{stem}-{number}-output{ext}"
+    return request, response
+
+
+def write_shards(
+    refs: t.Iterable[t.Dict[str, t.Any]],
+    filepath: str,
+    style_xml: t.Optional[str] = None,
+    compact: bool = False,
+    shard_size: t.Optional[int] = None,
+    shards: t.Optional[int] = None,
+) -> t.Dict[str, t.Any]:
+    """Writes entries as they are read to several self-contained
+    requests, stored next to `filepath`, and returns a manifest of
+    them. Either the number of entries per shard or the number of
+    shards must be given.
+
+    Entries that citeproc may need to disambiguate from one another are
+    kept in the same shard, so shards may be somewhat uneven in size.
+    """
+    dirname = os.path.dirname(filepath)
+    assigned: t.Dict[str, int] = dict()
+    writers: t.Dict[int, RequestWriter] = dict()
+    ids = list()
+    current = 1
+    with ExitStack() as stack:
+        for ref in refs:
+            key = disambiguation_key(ref)
+            if key in assigned:
+                number = assigned[key]
+            elif shards is not None:
+                number = zlib.crc32(key.encode("utf-8")) % shards + 1
+            else:
+                if current in writers and len(writers[current].ids) >= shard_size:
+                    current += 1
+                number = current
+            assigned[key] = number
+            if number not in writers:
+                request, _ = shard_filenames(filepath, number)
+                f = stack.enter_context(
+                    replace_on_success(os.path.join(dirname, request))
+                )
+                writers[number] = RequestWriter(f, style_xml=style_xml, compact=compact)
+            writers[number].add(ref)
+            ids.append(ref["id"])
+        for writer in writers.values():
+            writer.close()
+
+    manifest = {"shards": list(), "ids": ids}
+    for number in sorted(writers):
+        request, response = shard_filenames(filepath, number)
+        manifest["shards"].append(
+            {"input": request, "output": response, "ids": writers[number].ids}
+        )
+    return manifest
+
+
+def yaml_error_message(exc: yaml.YAMLError) -> str:
+    """Explains where a YAML parsing error occurred."""
+    # Error handling from https://stackoverflow.com/a/30407093
+    if not hasattr(exc, "problem_mark"):
+        return "Something went wrong while parsing yaml file"
+    problem = exc.problem if exc.context is None else f"{exc.problem} {exc.context}"
+    return (
+        f"Error while parsing YAML file:\n  parser says\n{exc.problem_mark}\n"
+        f"  {problem}\nPlease correct data and retry."
+    )
+
+
 @click.command(context_settings=CONTEXT_SETTINGS)
 @click.option(
     "-o",
     "--output",
-    type=click.File(mode="w", lazy=True),
+    type=click.Path(dir_okay=False, writable=True, allow_dash=True),
     default="-",
     help="Output file (default: STDOUT).",
 )
@@ -42,86 +308,76 @@ NUMBER_FIELDS = [
     type=click.File(mode="r", lazy=True),
     help="CSL style file to bundle.",
 )
+@click.option(
+    "-c",
+    "--compact",
+    is_flag=True,
+    help="Write JSON without indentation or spaces.",
+)
+@click.option(
+    "-n",
+    "--shard-size",
+    type=click.IntRange(min=1),
+    help="Split the request into shards of about this many entries.",
+)
+@click.option(
+    "-k",
+    "--shards",
+    type=click.IntRange(min=1),
+    help="Split the request into this many shards.",
+)
 @click.argument("input", type=click.File())
-def main(output, style, input):
+def main(output, style, compact, shard_size, shards, input):
     """
     Converts a pandoc-compatible CSL-YAML database into
     citeproc-js-server-compatible CSL-JSON data.
 
     If "-" is given as the YAML input filename, the database will be
     read from STDIN.
-    """
 
-    # Error handling from https://stackoverflow.com/a/30407093
-    try:
-        y_refs = yaml.load(input, Loader=yaml.CSafeLoader)
-    except yaml.YAMLError as exc:
-        click.echo("Error while parsing YAML file:")
-        if hasattr(exc, "problem_mark"):
-            if exc.context is None:
-                click.echo(
-                    f"  parser says\n{exc.problem_mark}\n  {exc.problem}\n"
-                    "Please correct data and retry."
-                )
-            else:
-                click.echo(
-                    f"  parser says\n{exc.problem_mark}\n  {exc.problem} "
-                    f"{exc.context}\nPlease correct data and retry."
-                )
-        else:
-            click.echo("Something went wrong while parsing yaml file")
-        click.Abort()
-        return
-
-    if not isinstance(y_refs, dict) or "references" not in y_refs:
-        raise click.ClickException(
-            message="YAML input should be an object/hash/dictionary with "
-            "a 'references' key."
-        )
+    Entries are read and written one at a time, so large databases can
+    be converted without holding them in memory. Output files are only
+    replaced once the whole database has been converted.
 
-    if not isinstance(y_refs["references"], list):
-        raise click.ClickException(
-            message="YAML input should be an object/hash/dictionary with "
-            "a 'references' key that maps to an array/list of entries."
-        )
-
-    j_refs = {"items": list(), "citationClusters": list()}
-    for i, ref in enumerate(y_refs["references"], start=1):
-        # Data quality checks
-        if "id" not in ref:
-            raise click.ClickException(
-                message="All entries must have an 'id' key/value pair."
-            )
-        for field in NUMBER_FIELDS:
-            if field in ref and isinstance((v := ref[field]), int):
-                print(f"WARNING: {ref['id']} > ‘{field}’ should be input as string.")
-                ref[field] = str(v)
-        # Remove pandoc-specific workaround for escaping underscores in URLs
-        url = ref.get("URL")
-        if url:
-            ref["URL"] = url.replace(r"\_", "_")
-
-        # Add to target data structure
-        j_refs["items"].append(ref)
-        j_refs["citationClusters"].append(
-            {
-                "citationItems": [{"id": ref["id"]}],
-                "properties": {"noteIndex": i},
-            }
+    With --shard-size or --shards, the entries are split between several
+    self-contained requests that can be processed concurrently. These
+    are written next to the output file, which instead receives a
+    manifest listing the entries in each shard and their original order.
+    The output file must be named <stem>-input.json: the requests are
+    named <stem>-input-<n>.json and the responses are expected in
+    <stem>-output-<n>.json.
+    """
+    if shard_size is not None and shards is not None:
+        raise click.UsageError("Use only one of --shard-size and --shards.")
+    sharded = shard_size is not None or shards is not None
+    if sharded and not output.endswith("-input.json"):
+        # check_output.py finds the other files from this name
+        raise click.UsageError(
+            "Sharded requests need an output file (-o) named <stem>-input.json."
         )
 
+    style_xml = None
     if style is not None:
-        xml_str = style.read()
-        j_refs["styleXML"] = re.sub(r"\n\s*", "", xml_str)
+        style_xml = re.sub(r"\n\s*", "", style.read())
 
-    json.dump(j_refs, output, ensure_ascii=False, indent=2)
+    refs = (prepare_reference(ref) for ref in iter_references(input))
+    try:
+        with replace_on_success(output) as f:
+            if sharded:
+                manifest = write_shards(
+                    refs,
+                    output,
+                    style_xml=style_xml,
+                    compact=compact,
+                    shard_size=shard_size,
+                    shards=shards,
+                )
+                json.dump(manifest, f, indent=None if compact else 2)
+            else:
+                write_request(refs, f, style_xml=style_xml, compact=compact)
+    except yaml.YAMLError as exc:
+        raise click.ClickException(yaml_error_message(exc))
 
 
 if __name__ == "__main__":
     main()
-
-"""
-Then:
-
-
-"""
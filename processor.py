@@ -1,8 +1,17 @@
 #!/usr/bin/env python3
 from dataclasses import dataclass, field
+import functools
+import hashlib
+import json
 from pathlib import Path
+import pickle
+import re
+import time
+import typing as t
 
 import click
+import yaml
+from mashumaro.config import BaseConfig
 from mashumaro.mixins.yaml import DataClassYAMLMixin
 
 
@@ -36,7 +45,7 @@ class Group(Base):
     prefix: str | None = None
     delim: str | None = None
     suffix: str | None = None
-    do: list[str, "Choice", "Group", Value] = field(default_factory=list)
+    do: list[t.Union["Choice", Value, "Group", str]] = field(default_factory=list)
     """String values should be Macro IDs."""
 
 
@@ -44,7 +53,7 @@ class Group(Base):
 class Filter(Base):
     only: list[str] = field(default_factory=list)
     """String values should be Template names."""
-    do: list[str, "Choice", Group, Value] = field(default_factory=list)
+    do: list[t.Union["Choice", Value, Group, str]] = field(default_factory=list)
     """String values should be Macro IDs."""
 
 
@@ -59,36 +68,700 @@ class Macro(Base):
     id_csl: str = ""
     id_blx: str = ""
     id_bst: str = ""
-    do: list[str, Choice, Group, Value] = field(default_factory=list)
+    do: list[t.Union[Choice, Value, Group, str]] = field(default_factory=list)
     """String values should be Macro IDs."""
 
 
 @dataclass(kw_only=True)
 class Model(Base):
     templates: list[Template] = field(default_factory=list)
-    root: list[str, Choice, Group, Value] = field(default_factory=list)
+    root: list[t.Union[Choice, Value, Group, str]] = field(default_factory=list)
     """String values should be Macro IDs."""
     macros: list[Macro] = field(default_factory=list)
 
 
+@dataclass(kw_only=True)
+class Step(Base):
+    """Instruction in a flattened plan. `begin` and `end` steps enclose
+    the contents of a group or macro (the latter giving its ID as
+    `val`), `value` steps output a value, and `missing` steps stand in
+    for undefined macros.
+    """
+
+    op: str
+    val: str = ""
+    prefix: str | None = None
+    delim: str | None = None
+    suffix: str | None = None
+    raw_csl: str = ""
+    raw_blx: str = ""
+    raw_bst: str = ""
+
+    class Config(BaseConfig):
+        omit_default = True
+
+
+@dataclass(kw_only=True)
+class Plan(Base):
+    """Model root specialised for a template and flattened into an
+    ordered list of steps.
+    """
+
+    template: str
+    steps: list[Step] = field(default_factory=list)
+
+    def macros(self) -> set[str]:
+        """Returns IDs of the macros reached, whether defined or not."""
+        return {
+            step.val
+            for step in self.steps
+            if step.op in ("begin", "missing") and step.val
+        }
+
+
+IMPLEMENTATIONS = ("csl", "blx", "bst")
+"""Abbreviations used for CSL, biblatex and BibTeX in attribute names."""
+
+DRIVER_ATTRS = {"csl": "csl_type", "blx": "blx_driver", "bst": "bst_driver"}
+"""Template attributes giving the driver used by each implementation."""
+
+
+class ModelIndex:
+    """Model with hash indexes for resolving references, built once when
+    the model is loaded:
+
+    - `macros`: macros by ID;
+    - `aliases`: for each implementation, macros by their ID there;
+    - `templates`: templates by name;
+    - `entries`: templates by the entry keys they list;
+    - `drivers`: for each implementation, templates by CSL type or
+      driver (a template may give several, separated by commas);
+    - `calls` and `callers`: IDs of macros that each macro (or `None`,
+      for the root) refers to directly, and the reverse;
+    - `plans`: flattened plan of the root for each template.
+
+    Raises ValueError if names are duplicated or macros refer to each
+    other in a cycle. References to undefined macros or templates are
+    listed in `dangling` as tuples of referrer and name.
+    """
+
+    def __init__(self, model: Model):
+        self.model = model
+        self.macros: dict[str, Macro] = dict()
+        self.aliases: dict[str, dict[str, list[Macro]]] = {
+            impl: dict() for impl in IMPLEMENTATIONS
+        }
+        self.templates: dict[str, Template] = dict()
+        self.entries: dict[str, Template] = dict()
+        self.drivers: dict[str, dict[str, list[Template]]] = {
+            impl: dict() for impl in IMPLEMENTATIONS
+        }
+        self.calls: dict[t.Optional[str], set[str]] = dict()
+        self.callers: dict[str, set[t.Optional[str]]] = dict()
+        self.dangling: list[tuple[str, str]] = list()
+
+        for template in model.templates:
+            if template.name in self.templates:
+                raise ValueError(f"Duplicate template: {template.name}.")
+            self.templates[template.name] = template
+            for entry in template.entries:
+                if entry in self.entries:
+                    raise ValueError(
+                        f"Entry {entry} in both {self.entries[entry].name} "
+                        f"and {template.name} templates."
+                    )
+                self.entries[entry] = template
+            for impl, attr in DRIVER_ATTRS.items():
+                for driver in filter(None, getattr(template, attr).split(",")):
+                    self.drivers[impl].setdefault(driver, list()).append(template)
+
+        for macro in model.macros:
+            if macro.id in self.macros:
+                raise ValueError(f"Duplicate macro: {macro.id}.")
+            self.macros[macro.id] = macro
+            for impl in IMPLEMENTATIONS:
+                alias = getattr(macro, f"id_{impl}")
+                if alias:
+                    self.aliases[impl].setdefault(alias, list()).append(macro)
+
+        self._scan(None, model.root)
+        for macro in model.macros:
+            self._scan(macro.id, macro.do)
+        self._check_cycles()
+
+        self.plans: dict[str, Plan] = {
+            name: self._compile_plan(name) for name in self.templates
+        }
+
+    def _scan(self, referrer: t.Optional[str], items: list) -> None:
+        """Records references made by items in a macro or the root."""
+        calls = self.calls.setdefault(referrer, set())
+        label = "root" if referrer is None else f"macro {referrer}"
+        for item in items:
+            if isinstance(item, str):
+                calls.add(item)
+                self.callers.setdefault(item, set()).add(referrer)
+                if item not in self.macros:
+                    self.dangling.append((label, item))
+            elif isinstance(item, Choice):
+                for option in item.choose:
+                    for name in option.only:
+                        if name not in self.templates:
+                            self.dangling.append((label, name))
+                    self._scan(referrer, option.do)
+            elif isinstance(item, Group):
+                self._scan(referrer, item.do)
+
+    def _compile_plan(self, template: str) -> Plan:
+        """Flattens the model root for the given template, resolving
+        choices and inlining macros.
+        """
+        steps = list()
+
+        def emit(items: list) -> None:
+            for item in items:
+                if isinstance(item, str):
+                    if item in self.macros:
+                        steps.append(Step(op="begin", val=item))
+                        emit(self.macros[item].do)
+                        steps.append(Step(op="end"))
+                    else:
+                        steps.append(Step(op="missing", val=item))
+                elif isinstance(item, Choice):
+                    for option in item.choose:
+                        if not option.only or template in option.only:
+                            emit(option.do)
+                            break
+                elif isinstance(item, Group):
+                    steps.append(
+                        Step(
+                            op="begin",
+                            prefix=item.prefix,
+                            delim=item.delim,
+                            suffix=item.suffix,
+                        )
+                    )
+                    emit(item.do)
+                    steps.append(Step(op="end"))
+                else:
+                    steps.append(
+                        Step(
+                            op="value",
+                            val=item.val,
+                            raw_csl=item.raw_csl,
+                            raw_blx=item.raw_blx,
+                            raw_bst=item.raw_bst,
+                        )
+                    )
+
+        emit(self.model.root)
+        return Plan(template=template, steps=steps)
+
+    def _check_cycles(self) -> None:
+        visiting = set()
+        visited = set()
+
+        def visit(macro_id: str, path: tuple[str, ...]) -> None:
+            visiting.add(macro_id)
+            for callee in sorted(self.calls.get(macro_id, ())):
+                if callee in visiting:
+                    cycle = path[path.index(callee) :] + (callee,)
+                    raise ValueError(f"Macro cycle: {' > '.join(cycle)}.")
+                if callee in self.macros and callee not in visited:
+                    visit(callee, path + (callee,))
+            visiting.discard(macro_id)
+            visited.add(macro_id)
+
+        for macro_id in self.macros:
+            if macro_id not in visited:
+                visit(macro_id, (macro_id,))
+
+
+CACHE_DIR = Path(__file__).parent / ".cache"
+
+
+def model_key(text: bytes) -> str:
+    """Returns hash identifying the model loaded from the given YAML by
+    the current version of this script.
+    """
+    h = hashlib.sha256(text)
+    h.update(Path(__file__).read_bytes())
+    return h.hexdigest()
+
+
+def load_model(
+    fp_model: Path, use_cache: bool = True
+) -> t.Tuple[ModelIndex, bool, float]:
+    """Loads and indexes model from YAML file, or loads a pickled
+    snapshot of the index (including plans) taken when the file and
+    this script were last as they are now.
+
+    Returns the index, whether it came from the snapshot, and the time
+    in seconds taken to parse and index the YAML (when the snapshot was
+    taken, if it was used).
+    """
+    text = fp_model.read_bytes()
+    key = model_key(text)
+    # Classes pickled when run as a script belong to __main__
+    fp_cache = CACHE_DIR / f"{fp_model.stem}.{Model.__module__.strip('_')}.pickle"
+
+    if use_cache and fp_cache.is_file():
+        try:
+            with fp_cache.open("rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, AttributeError, EOFError):
+            snapshot = dict()
+        if snapshot.get("key") == key:
+            return (snapshot["index"], True, snapshot["parse_time"])
+
+    start = time.perf_counter()
+    index = ModelIndex(Model.from_yaml(text))
+    parse_time = time.perf_counter() - start
+
+    if use_cache:
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp = fp_cache.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            pickle.dump(
+                {"key": key, "parse_time": parse_time, "index": index},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        tmp.replace(fp_cache)
+    return (index, False, parse_time)
+
+
+IMPLEMENTATION_NAMES = {"csl": "CSL", "blx": "biblatex", "bst": "BibTeX"}
+
+
+def make_view(index: ModelIndex, impl: str) -> dict[str, t.Any]:
+    """Returns the structure of the model as seen by one implementation:
+    the templates using each CSL type or driver, then for each template
+    its drivers, entries, the values listed for the implementation, the
+    fields output in order, and the macros used (under their names in
+    the implementation where given), then the names of all macros.
+    """
+    templates = dict()
+    for name, template in index.templates.items():
+        plan = index.plans[name]
+        fields = [
+            getattr(step, f"raw_{impl}") or step.val
+            for step in plan.steps
+            if step.op == "value"
+        ]
+        macros = list()
+        for step in plan.steps:
+            if step.op in ("begin", "missing") and step.val:
+                macro = index.macros.get(step.val)
+                alias = (macro and getattr(macro, f"id_{impl}")) or step.val
+                if alias not in macros:
+                    macros.append(alias)
+        templates[name] = {
+            "drivers": [
+                d for d in getattr(template, DRIVER_ATTRS[impl]).split(",") if d
+            ],
+            "entries": template.entries,
+            "vals": getattr(template, f"{impl}_vals"),
+            "fields": fields,
+            "macros": macros,
+        }
+    return {
+        "implementation": IMPLEMENTATION_NAMES[impl],
+        "drivers": {
+            driver: [template.name for template in driver_templates]
+            for driver, driver_templates in sorted(index.drivers[impl].items())
+        },
+        "templates": templates,
+        "macros": {
+            macro.id: getattr(macro, f"id_{impl}") or macro.id
+            for macro in index.model.macros
+        },
+    }
+
+
+CSL_VARIABLES = {
+    "journal": "container-title",
+    "series": "collection-title",
+    "type": "genre",
+    "chapter": "chapter-number",
+    "pages": "page",
+    "year": "issued",
+    "date": "issued",
+    "address": "publisher-place",
+    "location": "publisher-place",
+    "institution": "publisher",
+}
+"""Maps value names used in the model to CSL variables, where they
+differ and the value does not give `raw_csl`.
+"""
+
+_CSL_MARKUP = [
+    (re.compile(r'<span class="nocase">(.*?)</span>'), r"\1"),
+    (re.compile(r"<(?:i|em)>(.*?)</(?:i|em)>"), r"\\emph{\1}"),
+    (re.compile(r"<b>(.*?)</b>"), r"\\textbf{\1}"),
+    (re.compile(r"<sup>(.*?)</sup>"), r"\\textsuperscript{\1}"),
+    (re.compile(r"<sub>(.*?)</sub>"), r"\\textsubscript{\1}"),
+]
+_INITIAL_SPACE = re.compile(r"(?<=\.) (?=\w\.)")
+
+
+def csl_to_latex(text: str) -> str:
+    """Converts rich text in a CSL variable to LaTeX, in the form used
+    for targets in the CSL test document.
+    """
+    text = text.replace("&", "\\&").replace("%", "\\%")
+    for pattern, repl in _CSL_MARKUP:
+        text = pattern.sub(repl, text)
+    return text.replace("’", "'").replace("–", "--")
+
+
+def format_names(names: list[dict[str, str]]) -> str:
+    """Formats list of CSL names as `Family, I.I.`, separated by commas
+    apart from the last, which is preceded by `and`.
+    """
+    formatted = list()
+    for name in names:
+        if "literal" in name:
+            formatted.append(name["literal"])
+            continue
+        family = " ".join(
+            p for p in [name.get("non-dropping-particle"), name.get("family")] if p
+        )
+        given = _INITIAL_SPACE.sub("", name.get("given", ""))
+        formatted.append(f"{family}, {given}" if given else family)
+    if len(formatted) > 1:
+        return f"{', '.join(formatted[:-1])} and {formatted[-1]}"
+    return "".join(formatted)
+
+
+def format_variable(value: t.Any) -> str:
+    """Formats value of CSL variable as LaTeX."""
+    if isinstance(value, list):
+        return csl_to_latex(format_names(value))
+    if isinstance(value, dict):
+        if "date-parts" in value:
+            return str(value["date-parts"][0][0])
+        return csl_to_latex(str(value.get("literal", value.get("raw", ""))))
+    return csl_to_latex(str(value))
+
+
+CITATION_NAMES = ["author", "editor"]
+"""CSL variables giving the names used in citations, in order of
+preference. Items with none of them are cited by title.
+"""
+
+
+def format_citation_names(names: list[dict[str, str]]) -> str:
+    """Formats list of CSL names for a citation: up to three family
+    names (or literal names), or the first followed by `et al.`.
+    """
+    families = [
+        name.get("literal")
+        or " ".join(
+            p for p in [name.get("non-dropping-particle"), name.get("family")] if p
+        )
+        for name in names
+    ]
+    if len(families) > 3:
+        return f"{families[0]} et al."
+    if len(families) > 1:
+        return f"{', '.join(families[:-1])} and {families[-1]}"
+    return "".join(families)
+
+
+class Unsupported(Exception):
+    """Raised when an item cannot be formatted from the model."""
+
+
+class Formatter:
+    """Formats CSL items as references by interpreting the plans for
+    their templates. Templates are looked up by entry ID, falling back
+    to the templates for the item's CSL type whose `csl_vals` it
+    satisfies. Plans are compiled once per template into a list of
+    operations on CSL variables, so formatting a batch of items only
+    involves dictionary lookups.
+    """
+
+    def __init__(self, index: ModelIndex):
+        self.index = index
+        self._compiled: dict[str, t.Union[list[tuple], Unsupported]] = dict()
+
+    def template_for(self, item: dict[str, t.Any]) -> Template:
+        template = self.index.entries.get(item.get("id", ""))
+        if template is not None:
+            return template
+        for template in self.index.drivers["csl"].get(item.get("type", ""), []):
+            for condition in template.csl_vals:
+                variable, _, value = condition.partition("=")
+                if variable not in item or (value and item[variable] != value):
+                    break
+            else:
+                return template
+        raise Unsupported(f"no template for type {item.get('type')}")
+
+    def compile(self, template: str) -> list[tuple]:
+        """Returns operations for rendering the template: tuples of
+        `begin` with prefix, delimiter and suffix, `end`, or `value`
+        with CSL variable.
+        """
+        if template not in self._compiled:
+            ops: t.Union[list[tuple], Unsupported] = list()
+            for step in self.index.plans[template].steps:
+                if step.op == "begin":
+                    ops.append(("begin", step.prefix, step.delim, step.suffix))
+                elif step.op == "end":
+                    ops.append(("end",))
+                elif step.op == "value":
+                    variable = step.raw_csl or CSL_VARIABLES.get(step.val, step.val)
+                    ops.append(("value", variable))
+                else:
+                    ops = Unsupported(f"macro {step.val} is not defined")
+                    break
+            self._compiled[template] = ops
+        ops = self._compiled[template]
+        if isinstance(ops, Unsupported):
+            raise ops
+        return ops
+
+    def supported_templates(self) -> list[str]:
+        """Returns names of the templates whose plans use no undefined
+        macros, i.e. those that can be formatted.
+        """
+        supported = list()
+        for name in self.index.plans:
+            try:
+                self.compile(name)
+            except Unsupported:
+                continue
+            supported.append(name)
+        return supported
+
+    def format(self, item: dict[str, t.Any]) -> str:
+        """Returns reference for item as LaTeX. Raises Unsupported if
+        its template uses macros not yet defined in the model.
+        """
+        ops = self.compile(self.template_for(item).name)
+        parts: list[list[str]] = [[]]
+        affixes = list()
+        for op in ops:
+            if op[0] == "value":
+                value = item.get(op[1])
+                if value:
+                    parts[-1].append(format_variable(value))
+            elif op[0] == "begin":
+                parts.append(list())
+                affixes.append(op[1:])
+            else:
+                prefix, delim, suffix = affixes.pop()
+                text = (delim or "").join(parts.pop())
+                if text:
+                    parts[-1].append(f"{prefix or ''}{text}{suffix or ''}")
+        return "".join(parts[0])
+
+    def cite(self, item: dict[str, t.Any]) -> str:
+        """Returns parenthetical citation for item as LaTeX."""
+        for variable in CITATION_NAMES:
+            if item.get(variable):
+                who = csl_to_latex(format_citation_names(item[variable]))
+                break
+        else:
+            who = f"\\emph{{{csl_to_latex(item.get('title', ''))}}}"
+        try:
+            year = str(item["issued"]["date-parts"][0][0])
+        except (KeyError, IndexError, TypeError):
+            year = "n.d."
+        return f"({who}, {year})"
+
+    def format_all(
+        self, items: t.Iterable[dict[str, t.Any]]
+    ) -> t.Iterator[tuple[str, str, t.Optional[str], str]]:
+        """Formats a batch of items, yielding tuples of item ID,
+        citation, reference (None if unsupported) and reason if
+        unsupported.
+        """
+        for item in items:
+            try:
+                yield (item["id"], self.cite(item), self.format(item), "")
+            except Unsupported as e:
+                yield (item["id"], self.cite(item), None, str(e))
+
+
+class Session:
+    """State shared by subcommands. The model is only loaded when first
+    needed, so cached output can be produced without it.
+    """
+
+    def __init__(self, fp_model: Path, use_cache: bool):
+        self.fp_model = fp_model
+        self.use_cache = use_cache
+
+    @functools.cached_property
+    def key(self) -> str:
+        return model_key(self.fp_model.read_bytes())
+
+    @functools.cached_property
+    def index(self) -> ModelIndex:
+        start = time.perf_counter()
+        try:
+            index, cached, parse_time = load_model(self.fp_model, self.use_cache)
+        except ValueError as e:
+            raise click.ClickException(f"{self.fp_model.name}: {e}")
+        load_time = time.perf_counter() - start
+
+        if cached:
+            click.echo(
+                f"Loaded {len(index.templates)} templates from cache in "
+                f"{load_time * 1000:.1f} ms (parsing took {parse_time * 1000:.1f} ms).",
+                err=True,
+            )
+        else:
+            click.echo(
+                f"Loaded {len(index.templates)} templates in {load_time * 1000:.1f} ms.",
+                err=True,
+            )
+        if index.dangling:
+            click.echo(
+                f"{len(index.dangling)} references to undefined macros or templates "
+                "(see the dangling command).",
+                err=True,
+            )
+        return index
+
+    def view(self, impl: str) -> dict[str, t.Any]:
+        """Returns view for an implementation, generating it only if
+        the model has changed since it was last cached.
+        """
+        fp_cache = CACHE_DIR / f"{self.fp_model.stem}.views.json"
+        views = dict()
+        if self.use_cache and fp_cache.is_file():
+            try:
+                with fp_cache.open() as f:
+                    views = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                views = dict()
+            if views.get("key") == self.key and impl in views:
+                return views[impl]
+            if views.get("key") != self.key:
+                views = dict()
+
+        view = make_view(self.index, impl)
+        if self.use_cache:
+            views["key"] = self.key
+            views[impl] = view
+            CACHE_DIR.mkdir(exist_ok=True)
+            tmp = fp_cache.with_suffix(".tmp")
+            with tmp.open("w") as f:
+                json.dump(views, f, ensure_ascii=False)
+            tmp.replace(fp_cache)
+        return view
+
+
+def dump(data: t.Any, fmt: str) -> str:
+    """Serialises data as YAML or JSON."""
+    if fmt == "json":
+        return json.dumps(data, indent=2, ensure_ascii=False) + "\n"
+    return yaml.dump(data, sort_keys=False, allow_unicode=True)
+
+
+format_option = click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(["yaml", "json"]),
+    default="yaml",
+    show_default=True,
+)
+
+
 @click.group()
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Parse metamodel.yaml instead of loading the cached snapshot, "
+    "and regenerate views.",
+)
 @click.pass_context
-def main(ctx: click.Context):
+def main(ctx: click.Context, no_cache: bool):
     """Uses metamodel to generate various views suited for
     CSL, biblatex and BibTeX."""
     this_file = Path(__file__)
     dir_src = this_file.parent
     fp_model = dir_src / "metamodel.yaml"
-    with fp_model.open() as f:
-        model = Model.from_yaml(f.read())
-    ctx.obj = model
+    ctx.obj = Session(fp_model, use_cache=not no_cache)
+
 
-    click.echo(f"Loaded {len(model.templates)} templates.")
+@main.command()
+@click.pass_obj
+def dangling(session: Session):
+    """Lists references to undefined macros or templates."""
+    for referrer, name in session.index.dangling:
+        click.echo(f"{referrer}: {name}")
 
 
 @main.command()
-def test():
-    pass
+@format_option
+@click.argument("templates", nargs=-1)
+@click.pass_obj
+def plan(session: Session, fmt: str, templates: tuple[str, ...]):
+    """Prints flattened plans for the given templates (default: all)."""
+    index = session.index
+    for name in templates:
+        if name not in index.plans:
+            raise click.BadParameter(f"No such template: {name}.")
+    plans = [index.plans[name].to_dict() for name in templates or index.plans]
+    click.echo(dump(plans, fmt), nl=False)
+
+
+@main.command(name="format")
+@format_option
+@click.argument("database", type=click.File(encoding="utf-8"))
+@click.pass_obj
+def format_references(session: Session, fmt: str, database: t.TextIO):
+    """Formats the citations and references in a CSL-YAML database
+    using the model, for those entries whose templates are fully
+    defined. Until the model defines the macros its root uses, that
+    is none of them.
+    """
+    items = yaml.load(database, Loader=yaml.CSafeLoader)["references"]
+    formatter = Formatter(session.index)
+    if not formatter.supported_templates():
+        raise click.ClickException(
+            "No templates are fully defined in the model, so no entries can "
+            "be formatted (see the dangling command)."
+        )
+    references = dict()
+    unsupported = 0
+    for id, citation, reference, _ in formatter.format_all(items):
+        if reference is None:
+            unsupported += 1
+        else:
+            references[id] = {"citation": citation, "reference": reference}
+    click.echo(dump(references, fmt), nl=False)
+    if unsupported:
+        click.echo(
+            f"{unsupported} of {len(items)} entries could not be formatted.",
+            err=True,
+        )
+
+
+def view_command(impl: str, name: str) -> click.Command:
+    """Returns subcommand printing the view for an implementation."""
+
+    @format_option
+    @click.pass_obj
+    def command(session: Session, fmt: str):
+        click.echo(dump(session.view(impl), fmt), nl=False)
+
+    command.__doc__ = (
+        f"Prints the templates, drivers and macros of the model as seen by "
+        f"{IMPLEMENTATION_NAMES[impl]}."
+    )
+    return main.command(name=name)(command)
+
+
+csl = view_command("csl", "csl")
+biblatex = view_command("blx", "biblatex")
+bibtex = view_command("bst", "bibtex")
 
 
 if __name__ == "__main__":
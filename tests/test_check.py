@@ -0,0 +1,169 @@
+"""Tests for `check.py`."""
+
+from pathlib import Path
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import check
+
+ROOT = Path(__file__).resolve().parent.parent
+
+BBI = """\
+Bibliography
+\\bibitem{ou1972em}
+Open University, 1972. \\emph{Electricity and magnetism}. Bletchley: Open
+University Press.
+{}
+
+\\bibitem{rang.etal2012rdp}
+Rang, H.P., Dale, M.M., Ritter, J.M., Flower, R.J. and Henderson, G., 2012.
+
+\\emph{Rang and Dale's pharmacology}. 7th ed. Edinburgh: Churchill Livingstone.
+{}
+
+"""
+"""Records as extracted from the PDF by pdftotext, with a line break and
+a page break in the middle of references."""
+
+BBT = """\
+Bibliography
+\\bibitem{ou1972em}
+Open University, 1972. \\emph{Electricity and magnetism}. Bletchley: Open \
+University Press.
+{}
+
+\\bibitem{rang.etal2012rdp}
+Rang, H.P., Dale, M.M., Ritter, J.M., Flower, R.J. and Henderson, G., 2012. \
+\\emph{Rang and Dale's pharmacology}. 7th ed. Edinburgh: Churchill Livingstone.
+{}
+
+"""
+"""The same records as written by `biblatex/bibitem-text.lua`."""
+
+
+def test_bbt_matches_bbi(tmp_path):
+    bbi = tmp_path / "test-output.bbi"
+    bbi.write_text(BBI)
+    bbt = tmp_path / "test-output.bbt"
+    bbt.write_text(BBT)
+    records = list(check.read_bibitems(str(bbi)))
+    assert [key for key, _ in records] == ["ou1972em", "rang.etal2012rdp"]
+    assert records[0][1] == (
+        "Open University, 1972. \\emph{Electricity and magnetism}. "
+        "Bletchley: Open University Press."
+    )
+    assert list(check.read_bibitems(str(bbt))) == records
+
+
+def test_pdf_route_is_default():
+    for suite, (pdf_output, _) in check.BIBLATEX_OUTPUTS.items():
+        assert check.SUITE_BUILDS[suite] == [pdf_output]
+        assert check.MINIMAL_BUILDS[suite].output.endswith(".bbi")
+
+
+def test_recipe_os_error(monkeypatch, tmp_path):
+    def recipe(filepath, jobs):
+        raise FileNotFoundError(2, "No such file or directory", "pandoc")
+
+    filepath = str(tmp_path / "out.html")
+    monkeypatch.setitem(check.PYTHON_RECIPES, filepath, recipe)
+    returncode, log = check.run_recipe(filepath, capture=True)
+    assert returncode == 1
+    assert "pandoc" in log
+
+
+def test_recipe_jobs(monkeypatch, tmp_path):
+    calls = list()
+
+    def recipe(filepath, jobs):
+        calls.append(jobs)
+        with open(filepath, "w") as f:
+            f.write("")
+
+    filepath = str(tmp_path / "out.html")
+    monkeypatch.setitem(check.PYTHON_RECIPES, filepath, recipe)
+    monkeypatch.setattr(check.build_cache, "enabled", False)
+    assert check.schedule_builds([filepath], jobs=3) == set()
+    assert calls == [3]
+
+
+def test_recipes_share_jobs(monkeypatch, tmp_path):
+    calls = list()
+    lock = threading.Lock()
+    running = list()
+
+    def recipe(filepath, jobs):
+        with lock:
+            running.append(jobs)
+            calls.append(sum(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(jobs)
+        with open(filepath, "w") as f:
+            f.write("")
+
+    filepaths = [str(tmp_path / f"out{n}.html") for n in range(2)]
+    for filepath in filepaths:
+        monkeypatch.setitem(check.PYTHON_RECIPES, filepath, recipe)
+    monkeypatch.setattr(check.build_cache, "enabled", False)
+    assert check.schedule_builds(filepaths, jobs=3) == set()
+    assert calls == [3, 3]
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    """Git repository holding a copy of the CSL style and metamodel."""
+    for filepath in ["metamodel.yaml", "csl/harvard-university-of-bath.csl"]:
+        (tmp_path / filepath).parent.mkdir(exist_ok=True)
+        shutil.copy(ROOT / filepath, tmp_path / filepath)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(check.build_cache, "enabled", False)
+    for command in [
+        ["git", "init", "-q"],
+        ["git", "add", "."],
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        + ["commit", "-q", "-m", "Initial"],
+    ]:
+        subprocess.run(command, check=True)
+    return tmp_path
+
+
+def edit_macro(repo, name):
+    style = repo / "csl" / "harvard-university-of-bath.csl"
+    text = style.read_text()
+    start = text.index(f'<macro name="{name}">')
+    end = text.index("</macro>", start)
+    style.write_text(text[:end] + "  <text value=''/>\n  " + text[end:])
+
+
+def test_macro_called_from_layout(repo):
+    style = (repo / "csl" / "harvard-university-of-bath.csl").read_text()
+    layout = style[style.index("<bibliography") : style.index("</bibliography>")]
+    assert 'macro="year-date"' in layout
+    edit_macro(repo, "year-date")
+    assert check.affected_entries("HEAD", ["csl"]) is None
+
+
+def test_oracle_covers_nothing(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(check.build_cache, "enabled", False)
+    with pytest.raises(check.SuiteSkipped, match="none of the 39 templates"):
+        check.check_oracle()
+
+
+def test_process_usage(monkeypatch):
+    monkeypatch.setattr(check, "timings", check.Timings())
+    check.timings.enabled = True
+    r = check.run_process([sys.executable, "-c", "print(input())"], input="hi")
+    assert (r.returncode, r.stdout) == (0, "hi\n")
+    r = check.run_process(["git", "diff", "--no-such-option"])
+    assert r.returncode and "no-such-option" in r.stderr
+    names = [record["name"] for record in check.timings.records]
+    assert names == [os.path.basename(sys.executable), "git diff"]
+    assert all(record["stage"] == "process" for record in check.timings.records)
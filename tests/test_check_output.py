@@ -0,0 +1,26 @@
+"""Tests for `csl/check_output.py`."""
+
+import json
+
+from click.testing import CliRunner
+
+from check_output import is_manifest, main
+
+
+def test_is_manifest(tmp_path):
+    request = tmp_path / "x-input.json"
+    request.write_text(json.dumps({"items": [], "citationClusters": []}))
+    manifest = tmp_path / "y-input.json"
+    manifest.write_text(json.dumps({"shards": [], "ids": []}))
+    assert not is_manifest(str(request))
+    assert is_manifest(str(manifest))
+    assert not is_manifest(str(tmp_path / "z-input.json"))
+
+
+def test_request_uses_response(tmp_path):
+    request = tmp_path / "x-input.json"
+    request.write_text(json.dumps({"items": [], "citationClusters": []}))
+    (tmp_path / "x-raw.html").write_text("")
+    result = CliRunner().invoke(main, [str(request), str(tmp_path / "out.html")])
+    assert result.exit_code == 1
+    assert f"Please generate {tmp_path / 'x-output.json'}" in result.output
@@ -0,0 +1,130 @@
+"""Tests for `csl/citeproc_client.py`, against a stand-in for
+citeproc-js-server running on a free local port.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+import pytest
+
+import citeproc_client
+from citeproc_client import CiteprocError, chunk_items, convert, disambiguation_key
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Responds as citeproc-js-server would, citing each item by its ID,
+    after failing as many requests as the server is told to.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.requests.append(json.loads(body))
+            fail = self.server.failures > 0
+            self.server.failures -= 1
+        if fail:
+            self.respond(500, "Error: injected failure")
+            return
+        items = json.loads(body)["items"]
+        response = {
+            "bibliography": [
+                {"entry_ids": [[item["id"]] for item in items]},
+                [f"<div>{item['id']}</div>" for item in items],
+            ],
+            "citations": [[i, f"({item['id']})"] for i, item in enumerate(items)],
+        }
+        self.respond(200, json.dumps(response))
+
+    def respond(self, status, text):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    httpd.lock = threading.Lock()
+    httpd.requests = list()
+    httpd.failures = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr(citeproc_client.asyncio, "sleep", sleep)
+
+
+def author(family):
+    return [{"family": family, "given": "A."}]
+
+
+ITEMS = [
+    {"id": "smith2001", "author": author("Smith")},
+    {"id": "jones2001", "author": author("Jones")},
+    {"id": "smith2002", "author": author("Smith")},
+    {"id": "brown2001", "editor": author("Brown")},
+    {"id": "smith2003", "author": author("Smith")},
+    {"id": "anon2001", "title": "Anonymous work"},
+    {"id": "brown2002", "author": [{"literal": "Brown"}]},
+]
+
+
+def test_chunks_keep_disambiguation_groups():
+    chunks = chunk_items(ITEMS, 2)
+    assert [[item["id"] for item in chunk] for chunk in chunks] == [
+        ["smith2001", "smith2002", "smith2003"],
+        ["jones2001"],
+        ["brown2001", "brown2002"],
+        ["anon2001"],
+    ]
+
+
+def test_requests_keep_disambiguation_groups(server):
+    convert({"items": ITEMS}, url=server.url, chunk_size=2)
+    assert len(server.requests) > 1
+    chunk_of = dict()
+    for n, request in enumerate(server.requests):
+        for item in request["items"]:
+            assert chunk_of.setdefault(disambiguation_key(item), n) == n
+
+
+def test_citations_in_input_order(server):
+    result = convert({"items": ITEMS}, url=server.url, chunk_size=2, concurrency=3)
+    assert result["citations"] == [
+        [i, f"({item['id']})"] for i, item in enumerate(ITEMS)
+    ]
+    entry_ids = [ids[0] for ids in result["bibliography"][0]["entry_ids"]]
+    assert sorted(entry_ids) == sorted(item["id"] for item in ITEMS)
+    assert len(result["bibliography"][1]) == len(ITEMS)
+
+
+def test_retry_after_failures(server):
+    server.failures = 2
+    result = convert({"items": ITEMS}, url=server.url, concurrency=1, retries=2)
+    assert len(server.requests) == 3
+    assert len(result["citations"]) == len(ITEMS)
+
+
+def test_error_when_retries_run_out(server):
+    server.failures = 3
+    with pytest.raises(CiteprocError, match="injected failure"):
+        convert({"items": ITEMS}, url=server.url, concurrency=1, retries=2)
+    assert len(server.requests) == 3
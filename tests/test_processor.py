@@ -0,0 +1,107 @@
+"""Tests for the native formatter in `processor.py`."""
+
+from pathlib import Path
+
+import pytest
+import yaml
+
+from processor import Formatter, Group, Macro, Model, ModelIndex, Value
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def items():
+    with open(ROOT / "csl" / "bath-csl-test.yaml", encoding="utf-8") as f:
+        references = yaml.load(f, Loader=yaml.CSafeLoader)["references"]
+    return {item["id"]: item for item in references}
+
+
+@pytest.fixture(scope="module")
+def index():
+    """Index of `metamodel.yaml` with stand-in definitions for the
+    macros it leaves undefined, just enough to format simple books.
+    """
+    model = Model.from_yaml((ROOT / "metamodel.yaml").read_bytes())
+    defined = {macro.id for macro in model.macros}
+    stand_ins = [
+        Macro(id="author-or-other", do=[Value(val="author")]),
+        Macro(id="pub-year", do=[Value(val="year")]),
+        Macro(
+            id="title-block",
+            do=[Group(prefix="\\emph{", suffix="}", do=[Value(val="title")])],
+        ),
+        Macro(
+            id="pub-block",
+            do=[
+                Group(
+                    delim=": ",
+                    suffix=".",
+                    do=[Value(val="address"), Value(val="publisher")],
+                )
+            ],
+        ),
+    ]
+    for macro_id in [
+        "physical-access",
+        "status",
+        "idents",
+        "digital-access",
+        "addenda",
+    ]:
+        stand_ins.append(Macro(id=macro_id))
+    for macro in stand_ins:
+        assert macro.id not in defined
+        model.macros.append(macro)
+    return ModelIndex(model)
+
+
+def test_unsupported_without_macros(items):
+    model = Model.from_yaml((ROOT / "metamodel.yaml").read_bytes())
+    formatter = Formatter(ModelIndex(model))
+    [(key, citation, reference, reason)] = formatter.format_all([items["ou1972em"]])
+    assert key == "ou1972em"
+    assert citation == "(Open University, 1972)"
+    assert reference is None
+    assert "is not defined" in reason
+
+
+def test_format_book(index, items):
+    formatter = Formatter(index)
+    assert formatter.template_for(items["ou1972em"]).name == "book"
+    assert formatter.format(items["ou1972em"]) == (
+        "Open University, 1972. \\emph{Electricity and magnetism}. "
+        "Bletchley: Open University Press."
+    )
+
+
+def test_format_all(index, items):
+    results = list(
+        Formatter(index).format_all([items["ou1972em"], items["rang.etal2012rdp"]])
+    )
+    assert [(key, citation) for key, citation, _, _ in results] == [
+        ("ou1972em", "(Open University, 1972)"),
+        ("rang.etal2012rdp", "(Rang et al., 2012)"),
+    ]
+    assert all(reference is not None for _, _, reference, _ in results)
+    assert results[1][2].startswith(
+        "Rang, H.P., Dale, M.M., Ritter, J.M., Flower, R.J. and Henderson, G., 2012. "
+        "\\emph{Rang and Dale's pharmacology}."
+    )
+
+
+@pytest.mark.parametrize(
+    "key, citation",
+    [
+        ("rothman.etal2008me", "(Rothman, Greenland and Lash, 2008)"),
+        ("aspirin2021bnf", "(\\emph{Aspirin}, 2021)"),
+    ],
+)
+def test_cite(index, items, key, citation):
+    assert Formatter(index).cite(items[key]) == citation
+
+
+def test_supported_templates(index):
+    model = Model.from_yaml((ROOT / "metamodel.yaml").read_bytes())
+    assert Formatter(ModelIndex(model)).supported_templates() == []
+    assert "book" in Formatter(index).supported_templates()
@@ -0,0 +1,59 @@
+"""Tests for `csl/yaml2json.py`."""
+
+import json
+
+from click.testing import CliRunner
+
+from yaml2json import main
+
+GOOD = """\
+references:
+- id: a
+  title: First
+- id: b
+  title: Second
+"""
+
+BAD = """\
+references:
+- id: a
+  title: First
+- id: b
+  title: [unclosed
+"""
+
+
+def test_convert(tmp_path):
+    (tmp_path / "in.yaml").write_text(GOOD)
+    output = tmp_path / "out.json"
+    result = CliRunner().invoke(main, ["-o", str(output), str(tmp_path / "in.yaml")])
+    assert result.exit_code == 0
+    data = json.loads(output.read_text())
+    assert [item["id"] for item in data["items"]] == ["a", "b"]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["in.yaml", "out.json"]
+
+
+def test_yaml_error_keeps_output(tmp_path):
+    (tmp_path / "in.yaml").write_text(BAD)
+    output = tmp_path / "out.json"
+    output.write_text("{}")
+    result = CliRunner().invoke(main, ["-o", str(output), str(tmp_path / "in.yaml")])
+    assert result.exit_code == 1
+    assert "Error while parsing YAML file" in result.output
+    assert output.read_text() == "{}"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["in.yaml", "out.json"]
+
+
+def test_shards_need_input_name(tmp_path):
+    (tmp_path / "in.yaml").write_text(GOOD)
+    runner = CliRunner()
+    args = ["-k", "2", str(tmp_path / "in.yaml")]
+    result = runner.invoke(main, ["-o", str(tmp_path / "y.json")] + args)
+    assert result.exit_code == 2
+    assert not (tmp_path / "y.json").exists()
+    result = runner.invoke(main, ["-o", str(tmp_path / "y-input.json")] + args)
+    assert result.exit_code == 0
+    manifest = json.loads((tmp_path / "y-input.json").read_text())
+    assert manifest["ids"] == ["a", "b"]
+    for shard in manifest["shards"]:
+        assert (tmp_path / shard["input"]).exists()